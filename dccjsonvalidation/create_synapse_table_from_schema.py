@@ -23,8 +23,6 @@ Execution (overwrite table): create_synapse_table_from_schema.py --json_schema_f
 """
 
 import argparse
-import os
-from urllib.parse import urldefrag
 import pandas as pd
 import synapseclient
 from synapseclient import Column, Schema, Table
@@ -44,15 +42,10 @@ def process_schema(json_schema_file):
     Returns: Pandas dataframe
     """
 
-    ref_module_dict = {}
-
     ref_location_dict, json_schema = schema_tools.load_and_deref(json_schema_file)
 
     # Derive the name of the annotations module from the reference location.
-    for schema_key in ref_location_dict:
-        ref_doc, _ = urldefrag(ref_location_dict[schema_key])
-        _, ref_file = os.path.split(ref_doc)
-        ref_module_dict[schema_key] = os.path.splitext(ref_file)[0]
+    ref_module_dict = schema_tools.get_module_names(ref_location_dict)
 
     ref_module_df = pd.DataFrame(list(ref_module_dict.items()),
                                  columns=["key", "module"])
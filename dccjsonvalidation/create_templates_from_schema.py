@@ -12,14 +12,18 @@ Purpose: Use a JSON validation schema to generate either csv file templates
          - a listing of allowable values for columns that use a controlled
            vocabulary list
 
+         The dictionary and the values listing can also be written as typed
+         Parquet or Arrow IPC files, which include the annotations module of
+         each column. No blank template is written in this case.
+
 Input parameters: Full pathname to the JSON validation schema
                   Full pathname to the output template file
-                  Desired output - either csv or excel
+                  Desired output - csv, excel, parquet or arrow
 
-Outputs: csv template file or Excel workbook
+Outputs: csv template file, Excel workbook, or Parquet/Arrow IPC files
 
 Execution: create_templates_from_schema.py <JSON schema> <output file>
-             <csv/excel>
+             <csv/excel/parquet/arrow>
 
 """
 
@@ -36,12 +40,19 @@ def main():
     parser.add_argument("output_file", type=str,
                         help="Full pathname for the output file")
     parser.add_argument("type_of_output", type=str,
-                        help="Type of output (csv or excel)")
+                        help="Type of output (csv, excel, parquet or arrow)")
 
     args = parser.parse_args()
 
-    _, json_schema = schema_tools.load_and_deref(args.json_schema_file)
+    ref_location_dict, json_schema = schema_tools.load_and_deref(args.json_schema_file)
     definitions_df, values_df = schema_tools.get_definitions_values(json_schema)
+
+    if args.type_of_output in ("parquet", "arrow"):
+        template_tools.dictionary_arrow(args.output_file, definitions_df, values_df,
+                                        schema_tools.get_module_names(ref_location_dict),
+                                        file_format=args.type_of_output)
+        return
+
     definitions_df = definitions_df[["key", "description"]]
     template_df = pd.DataFrame(columns=definitions_df["key"].tolist())
 
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+"""
+Program: key_tools.py
+
+Purpose: Functions and classes used to check constraints across the records
+         of a manifest file: unique keys, and foreign keys into another
+         manifest file.
+
+The constraints are declared at the top level of the JSON validation schema,
+alongside "properties". jsonschema ignores these keywords.
+
+    "uniqueKeys": [["specimenID"], ["individualID", "assay"]],
+    "foreignKeys": [{"columns": ["individualID"],
+                     "manifest": "individual",
+                     "referenceColumns": ["individualID"]}]
+
+"referenceColumns" defaults to "columns". The "manifest" name is matched to
+a file given to validate_using_schema.py with
+--reference_manifest <name>=<path>.
+
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import jsonschema
+import schema_tools
+
+
+def key_value(record, columns):
+    """
+    Function: key_value
+
+    Purpose: Build the key for a record from the values in the key columns.
+
+    Values are compared as strings, so that a key read as a number in one
+    manifest file matches the same key read as a string in another. Whole
+    numbers read as floats (e.g. in a column with empty fields) are written
+    without a decimal point, so 1.0 matches "1".
+
+    Arguments:
+        record - A dictionary or mapping representing a single record
+        columns - A list of the key column names
+
+    Returns: The key as a JSON encoded list of strings, or None if any of the
+             key columns is empty in the record.
+    """
+    key_list = []
+
+    for column in columns:
+        if column not in record:
+            return None
+        value = schema_tools.convert_bool_to_string(record[column])
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        key_list.append(str(schema_tools.convert_numeric_to_string(value)))
+
+    return json.dumps(key_list)
+
+
+def missing_reference_manifests(json_schema, reference_manifests):
+    """
+    Function: missing_reference_manifests
+
+    Purpose: Find the manifest names used in the "foreignKeys" of a schema
+             that have no reference manifest file.
+
+    Arguments:
+        json_schema - A dereferenced JSON schema in dictionary form
+        reference_manifests - A dictionary of manifest names and their file
+                              names
+
+    Returns: A list of the missing manifest names
+    """
+    return [foreign_key["manifest"] for foreign_key in json_schema.get("foreignKeys", [])
+            if foreign_key["manifest"] not in reference_manifests]
+
+
+def reference_manifest_problems(json_schema, reference_manifests):
+    """
+    Function: reference_manifest_problems
+
+    Purpose: Check that the reference manifest files used in the
+             "foreignKeys" of a schema exist and have the referenced columns.
+
+    Arguments:
+        json_schema - A dereferenced JSON schema in dictionary form
+        reference_manifests - A dictionary of manifest names and their file
+                              names
+
+    Returns: A list of messages describing the problems found
+    """
+    import pandas as pd
+
+    problems = []
+
+    for foreign_key in json_schema.get("foreignKeys", []):
+        manifest_name = foreign_key["manifest"]
+        if manifest_name not in reference_manifests:
+            continue
+
+        manifest_file_name = reference_manifests[manifest_name]
+        if not os.path.isfile(manifest_file_name):
+            problems.append(f"reference manifest {manifest_name} file not found: "
+                            f"{manifest_file_name}")
+            continue
+
+        try:
+            manifest_columns = pd.read_csv(manifest_file_name, nrows=0).columns
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as read_error:
+            problems.append(f"reference manifest {manifest_name} ({manifest_file_name}) "
+                            f"cannot be read: {read_error}")
+            continue
+
+        missing_columns = [column
+                           for column in foreign_key.get("referenceColumns", foreign_key["columns"])
+                           if column not in manifest_columns]
+        if missing_columns:
+            problems.append(f"reference manifest {manifest_name} ({manifest_file_name}) has no "
+                            f"column(s) {', '.join(missing_columns)}")
+
+    return problems
+
+
+class KeyIndex:
+    """
+    Class: KeyIndex
+
+    Purpose: A hash index from keys to the number of the record in which the
+             key was first seen.
+
+    The index is kept in memory until it holds more than max_keys keys. It is
+    then moved to an SQLite database in a temporary directory, and continues
+    there, so that very large manifests do not run out of memory. Call close()
+    to remove the temporary database.
+    """
+
+    def __init__(self, max_keys=1000000):
+        self.max_keys = max_keys
+        self.memory_index = {}
+        self.temp_dir = None
+        self.connection = None
+
+    def _spill(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.connection = sqlite3.connect(os.path.join(self.temp_dir.name, "key_index.db"),
+                                          isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = OFF")
+        self.connection.execute("PRAGMA synchronous = OFF")
+        self.connection.execute("CREATE TABLE key_index (key TEXT PRIMARY KEY, record INTEGER)")
+        self.connection.executemany("INSERT INTO key_index VALUES (?, ?)",
+                                    self.memory_index.items())
+        self.memory_index = None
+
+    def get(self, key):
+        """
+        Return the record number in which the key was first seen, or None if
+        the key is not in the index.
+        """
+        if self.connection is None:
+            return self.memory_index.get(key)
+
+        row = self.connection.execute("SELECT record FROM key_index WHERE key = ?",
+                                      (key,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, key, record_number):
+        """
+        Add a key to the index.
+
+        Returns: The record number in which the key was first seen if it was
+                 already in the index, otherwise None.
+        """
+        first_record = self.get(key)
+        if first_record is not None:
+            return first_record
+
+        if self.connection is None:
+            self.memory_index[key] = record_number
+            if len(self.memory_index) > self.max_keys:
+                self._spill()
+        else:
+            self.connection.execute("INSERT INTO key_index VALUES (?, ?)",
+                                    (key, record_number))
+
+        return None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.temp_dir.cleanup()
+            self.connection = None
+            self.temp_dir = None
+
+
+def reference_index(manifest_file_name, columns, max_keys=1000000):
+    """
+    Function: reference_index
+
+    Purpose: Build a KeyIndex of the keys in a reference manifest file. The
+             file is read in chunks, so only the index is kept in memory.
+
+    Arguments:
+        manifest_file_name - Full pathname for the reference manifest file
+        columns - A list of the key column names in the reference manifest
+        max_keys - The number of keys to hold in memory
+
+    Returns: A KeyIndex object
+    """
+    import pandas as pd
+
+    key_index = KeyIndex(max_keys=max_keys)
+    first_record = 2
+
+    for manifest_chunk in pd.read_csv(manifest_file_name, usecols=columns, dtype=str,
+                                      chunksize=100000):
+        for row_number, row_values in enumerate(manifest_chunk.itertuples(index=False)):
+            key = key_value({column: value for column, value in zip(columns, row_values)
+                             if not pd.isna(value)},
+                            columns)
+            if key is not None:
+                key_index.add(key, first_record + row_number)
+        first_record += len(manifest_chunk)
+
+    return key_index
+
+
+class KeyChecker:
+    """
+    Class: KeyChecker
+
+    Purpose: Check the "uniqueKeys" and "foreignKeys" constraints of a schema
+             in a single pass over the records.
+
+    The errors are returned as jsonschema ValidationError objects so that
+    they can be reported with schema_tools.validation_errors or an
+    ErrorAggregator in the same way as the errors from the validator. A key
+    on a single column is reported against that column. A record with an
+    empty key column is not checked against that key.
+    """
+
+    def __init__(self, json_schema, reference_manifests=None, max_keys=1000000):
+        """
+        Arguments:
+            json_schema - A dereferenced JSON schema in dictionary form
+            reference_manifests - A dictionary of manifest names used in
+                                  "foreignKeys" and their file names
+            max_keys - The number of keys to hold in memory per index
+        """
+        reference_manifests = reference_manifests or {}
+
+        self.unique_keys = [(columns, KeyIndex(max_keys=max_keys))
+                            for columns in json_schema.get("uniqueKeys", [])]
+        self.foreign_keys = []
+
+        for foreign_key in json_schema.get("foreignKeys", []):
+            if foreign_key["manifest"] not in reference_manifests:
+                raise ValueError(f"No reference manifest given for "
+                                 f"\"{foreign_key['manifest']}\"")
+            self.foreign_keys.append(
+                (foreign_key,
+                 reference_index(reference_manifests[foreign_key["manifest"]],
+                                 foreign_key.get("referenceColumns", foreign_key["columns"]),
+                                 max_keys=max_keys)))
+
+    def __bool__(self):
+        return bool(self.unique_keys or self.foreign_keys)
+
+    @staticmethod
+    def _key_error(message, validator, key_number, columns, record):
+        if len(columns) == 1:
+            schema_path = ("properties", columns[0], validator)
+            instance = record[columns[0]]
+        else:
+            schema_path = (validator, key_number)
+            instance = tuple(record[column] for column in columns)
+
+        return jsonschema.ValidationError(message, validator=validator,
+                                          schema_path=schema_path,
+                                          instance=instance)
+
+    def iter_errors(self, record, record_number):
+        """
+        Check a record and add its keys to the unique key indexes.
+
+        Arguments:
+            record - A dictionary or mapping representing a single record
+            record_number - The record number used in the error messages
+
+        Returns: A generator of jsonschema ValidationError objects
+        """
+        for key_number, (columns, key_index) in enumerate(self.unique_keys):
+            key = key_value(record, columns)
+            if key is None:
+                continue
+
+            first_record = key_index.add(key, record_number)
+            if first_record is not None:
+                yield self._key_error(f"{self._values_string(record, columns)} is not unique "
+                                      f"(first seen in Record {first_record})",
+                                      "uniqueKeys", key_number, columns, record)
+
+        for key_number, (foreign_key, key_index) in enumerate(self.foreign_keys):
+            columns = foreign_key["columns"]
+            key = key_value(record, columns)
+            if key is None:
+                continue
+
+            if key_index.get(key) is None:
+                yield self._key_error(f"{self._values_string(record, columns)} is not found "
+                                      f"in the {foreign_key['manifest']} manifest",
+                                      "foreignKeys", key_number, columns, record)
+
+    @staticmethod
+    def _values_string(record, columns):
+        if len(columns) == 1:
+            return repr(record[columns[0]])
+        return ", ".join(f"{column} {record[column]!r}" for column in columns)
+
+    def close(self):
+        for _, key_index in self.unique_keys + self.foreign_keys:
+            key_index.close()
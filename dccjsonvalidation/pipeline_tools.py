@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+
+"""
+Program: pipeline_tools.py
+
+Purpose: Validate a csv manifest file in a pipeline of stages, so that
+         reading and parsing the file overlaps with validation:
+
+         reader -> coercion -> validator workers -> writer
+
+         The stages run in separate threads and are connected by bounded
+         queues. The file is passed through the pipeline in chunks of
+         records, and the number of chunks in the pipeline is limited, so a
+         fast reader waits for the slower stages (backpressure) instead of
+         reading the whole file into memory. The reader reads the records as
+         strings, and the coercion stage converts the columns to the types
+         inferred from the first records of the file. The writer puts the chunks back
+         in file order before it checks unique and foreign keys and reports
+         the errors.
+
+"""
+
+import itertools
+import queue
+import threading
+import time
+import schema_tools
+
+
+# Put on a queue to tell the next stage that there are no more chunks.
+END_OF_CHUNKS = object()
+
+
+class StageStats:
+    """
+    Class: StageStats
+
+    Purpose: Count the chunks and records handled by a pipeline stage, the
+             time spent working, and the depth of the queue the stage reads
+             from. The counts can be updated from several threads.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.chunks = 0
+        self.records = 0
+        self.busy_seconds = 0.0
+        self.queue_depth_total = 0
+        self.queue_depth_max = 0
+        self.lock = threading.Lock()
+
+    def add(self, records, busy_seconds, queue_depth=None):
+        with self.lock:
+            self.chunks += 1
+            self.records += records
+            self.busy_seconds += busy_seconds
+            if queue_depth is not None:
+                self.queue_depth_total += queue_depth
+                self.queue_depth_max = max(self.queue_depth_max, queue_depth)
+
+
+class ValidationPipeline:
+    """
+    Class: ValidationPipeline
+
+    Purpose: Run the reader, coercion, validator and writer stages for a
+             manifest file validated against one or more schemas.
+
+    The validator workers are threads, so they overlap validation with the
+    file reading and parsing done by the reader, but do not validate in
+    parallel with each other.
+
+    If fail_fast is True, the pipeline stops after the first record with
+    errors, and all of the stages are shut down.
+    """
+
+    def __init__(self, json_schemas, schema_validators, key_checkers, schema_labels,
+                 error_aggregators=None, column_types=None, workers=2, queue_size=4,
+                 fail_fast=False):
+        """
+        Arguments:
+            json_schemas - A list of dereferenced JSON schemas
+            schema_validators - A validator for each schema
+            key_checkers - A key_tools.KeyChecker for each schema
+            schema_labels - The label to add to the errors for each schema
+            error_aggregators - A schema_tools.ErrorAggregator for each schema,
+                                or None to write the errors for each record
+            column_types - The types to convert the columns to for the
+                           schemas that do not take them as strings, as
+                           returned by schema_tools.get_column_types
+            workers - The number of validator worker threads
+            queue_size - The maximum number of chunks in each queue
+            fail_fast - Stop after the first record with errors
+        """
+        self.json_schemas = json_schemas
+        self.schema_validators = schema_validators
+        self.key_checkers = key_checkers
+        self.schema_labels = schema_labels
+        self.error_aggregators = error_aggregators
+        self.column_types = column_types or {}
+        self.workers = workers
+        self.queue_size = queue_size
+        self.fail_fast = fail_fast
+
+        self.stop_event = threading.Event()
+        self.stage_errors = []
+        self.stage_stats = [StageStats("reader"), StageStats("coercion"),
+                            StageStats("validator"), StageStats("writer")]
+        self.elapsed_seconds = 0.0
+
+    def _put(self, stage_queue, item):
+        """
+        Put an item on a queue, waiting while it is full unless the pipeline
+        is stopped. Returns False if the pipeline was stopped.
+        """
+        while not self.stop_event.is_set():
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, stage_queue):
+        """
+        Get an item from a queue, waiting while it is empty unless the
+        pipeline is stopped. Returns END_OF_CHUNKS if the pipeline was stopped.
+        """
+        while not self.stop_event.is_set():
+            try:
+                return stage_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return END_OF_CHUNKS
+
+    def _run_stage(self, stage_function, *stage_args):
+        try:
+            stage_function(*stage_args)
+        except Exception as stage_error:
+            self.stage_errors.append(stage_error)
+            self.stop_event.set()
+
+    def _reader(self, manifest_chunks, chunks_in_flight, parse_queue):
+        reader_stats = self.stage_stats[0]
+        chunk_iterator = iter(manifest_chunks)
+
+        for chunk_number in itertools.count():
+            # Wait until there is room in the pipeline for another chunk.
+            while not chunks_in_flight.acquire(timeout=0.1):
+                if self.stop_event.is_set():
+                    return
+            if self.stop_event.is_set():
+                return
+
+            start_time = time.perf_counter()
+            manifest_df = next(chunk_iterator, None)
+            if manifest_df is None:
+                self._put(parse_queue, END_OF_CHUNKS)
+                return
+            reader_stats.add(len(manifest_df), time.perf_counter() - start_time)
+
+            if not self._put(parse_queue, (chunk_number, manifest_df)):
+                return
+
+    def _coercion(self, parse_queue, validate_queue):
+        coercion_stats = self.stage_stats[1]
+
+        while True:
+            queue_depth = parse_queue.qsize()
+            chunk = self._get(parse_queue)
+            if chunk is END_OF_CHUNKS:
+                for _ in range(self.workers):
+                    self._put(validate_queue, END_OF_CHUNKS)
+                return
+
+            start_time = time.perf_counter()
+            chunk_number, manifest_df = chunk
+            # The chunks are read as strings; the converted columns are used
+            # for the schemas that do not take them as strings.
+            converted_df = schema_tools.convert_column_types(manifest_df, self.column_types)
+            manifest_columns = schema_tools.ManifestColumns(manifest_df, self.json_schemas[0])
+            schema_columns = [manifest_columns.for_schema(json_schema, converted_df)
+                              for json_schema in self.json_schemas]
+            coercion_stats.add(len(manifest_columns), time.perf_counter() - start_time,
+                               queue_depth)
+
+            if not self._put(validate_queue, (chunk_number, schema_columns)):
+                return
+
+    def _validator(self, validate_queue, write_queue):
+        validator_stats = self.stage_stats[2]
+
+        while True:
+            queue_depth = validate_queue.qsize()
+            chunk = self._get(validate_queue)
+            if chunk is END_OF_CHUNKS:
+                self._put(write_queue, END_OF_CHUNKS)
+                return
+
+            start_time = time.perf_counter()
+            chunk_number, schema_columns = chunk
+            chunk_errors = [[list(schema_validator.iter_errors(data_record))
+                             for schema_validator, data_record
+                             in zip(self.schema_validators, data_records)]
+                            for data_records in zip(*schema_columns)]
+            validator_stats.add(len(chunk_errors), time.perf_counter() - start_time,
+                                queue_depth)
+
+            if not self._put(write_queue, (chunk_number, schema_columns, chunk_errors)):
+                return
+
+    def _write_chunk(self, schema_columns, chunk_errors, first_record, output):
+        """
+        Check the keys and report the errors for the records in a chunk.
+        Returns True if the pipeline should stop.
+        """
+        for row_number, record_errors in enumerate(chunk_errors):
+            record_number = first_record + row_number
+            record_failed = False
+
+            for schema_number, schema_errors in enumerate(record_errors):
+                key_checker = self.key_checkers[schema_number]
+                if key_checker:
+                    schema_errors = schema_errors + list(key_checker.iter_errors(
+                        schema_columns[schema_number].row(row_number), record_number))
+
+                record_failed = record_failed or bool(schema_errors)
+
+                if self.error_aggregators is not None:
+                    self.error_aggregators[schema_number].add(schema_errors, record_number)
+                    continue
+
+                row_error = schema_tools.validation_errors(
+                    schema_errors,
+                    line_prepend=f"Record {record_number}: ",
+                    schema_prepend=self.schema_labels[schema_number])
+
+                if row_error:
+                    output.write(row_error)
+
+            if self.fail_fast and record_failed:
+                return True
+
+        return False
+
+    def run(self, manifest_chunks, first_record, output):
+        """
+        Run the pipeline. The writer stage runs in the calling thread.
+
+        Arguments:
+            manifest_chunks - An iterable of pandas dataframes, e.g. from
+                              schema_tools.read_manifest_chunks
+            first_record - The record number of the first record
+            output - A file object to write the errors for each record to
+        """
+        start_time = time.perf_counter()
+        writer_stats = self.stage_stats[3]
+
+        chunks_in_flight = threading.Semaphore(2 * self.queue_size + self.workers)
+        parse_queue = queue.Queue(maxsize=self.queue_size)
+        validate_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+
+        stage_threads = [threading.Thread(target=self._run_stage, daemon=True,
+                                          args=(self._reader, manifest_chunks,
+                                                chunks_in_flight, parse_queue)),
+                         threading.Thread(target=self._run_stage, daemon=True,
+                                          args=(self._coercion, parse_queue, validate_queue))]
+        stage_threads.extend(threading.Thread(target=self._run_stage, daemon=True,
+                                              args=(self._validator, validate_queue,
+                                                    write_queue))
+                             for _ in range(self.workers))
+        for stage_thread in stage_threads:
+            stage_thread.start()
+
+        # The validator workers can finish chunks out of order, so hold them
+        # until the next chunk in file order arrives.
+        pending_chunks = {}
+        next_chunk = 0
+        next_record = first_record
+        finished_workers = 0
+
+        while finished_workers < self.workers and not self.stop_event.is_set():
+            queue_depth = write_queue.qsize()
+            chunk = self._get(write_queue)
+            if chunk is END_OF_CHUNKS:
+                finished_workers += 1
+                continue
+
+            chunk_number, schema_columns, chunk_errors = chunk
+            pending_chunks[chunk_number] = (schema_columns, chunk_errors)
+
+            while next_chunk in pending_chunks:
+                write_start_time = time.perf_counter()
+                schema_columns, chunk_errors = pending_chunks.pop(next_chunk)
+                stop_pipeline = self._write_chunk(schema_columns, chunk_errors,
+                                                  next_record, output)
+                writer_stats.add(len(chunk_errors), time.perf_counter() - write_start_time,
+                                 queue_depth)
+
+                next_record += len(chunk_errors)
+                next_chunk += 1
+                chunks_in_flight.release()
+
+                if stop_pipeline:
+                    self.stop_event.set()
+                    break
+
+        self.stop_event.set()
+        for stage_thread in stage_threads:
+            stage_thread.join()
+
+        self.elapsed_seconds = time.perf_counter() - start_time
+
+        if self.stage_errors:
+            raise self.stage_errors[0]
+
+    def stats_report(self):
+        """
+        Create a report of the records, throughput and queue depth of each
+        stage.
+
+        Returns: A string containing the report
+        """
+        report_string = (f"Pipeline: {self.elapsed_seconds:.2f} s elapsed, "
+                         f"{self.workers} validator workers, queue size {self.queue_size}\n")
+        report_string += (f"{'Stage':<10} {'Chunks':>8} {'Records':>10} {'Busy (s)':>9} "
+                          f"{'Utilization':>11} {'Records/s':>10} {'Queue avg':>9} "
+                          f"{'Queue max':>9}\n")
+
+        for stage_stats in self.stage_stats:
+            # Utilization is relative to the elapsed time; the validator stage
+            # is shared by all of the workers.
+            stage_threads = self.workers if stage_stats.name == "validator" else 1
+            utilization = (stage_stats.busy_seconds / (self.elapsed_seconds * stage_threads)
+                           if self.elapsed_seconds else 0.0)
+            records_per_second = (stage_stats.records / stage_stats.busy_seconds
+                                  if stage_stats.busy_seconds else 0.0)
+            if stage_stats.name == "reader":
+                queue_avg, queue_max = "", ""
+            else:
+                queue_avg = (f"{stage_stats.queue_depth_total / stage_stats.chunks:.1f}"
+                             if stage_stats.chunks else "0.0")
+                queue_max = str(stage_stats.queue_depth_max)
+
+            report_string += (f"{stage_stats.name:<10} {stage_stats.chunks:>8} "
+                              f"{stage_stats.records:>10} {stage_stats.busy_seconds:>9.2f} "
+                              f"{utilization:>11.1%} {records_per_second:>10.0f} "
+                              f"{queue_avg:>9} {queue_max:>9}\n")
+
+        return report_string
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+"""
+Program: sample_tools.py
+
+Purpose: Functions and classes used to validate a sample of the records in
+         a manifest file and estimate the failure rates for the whole file.
+
+"""
+
+import csv
+import io
+import math
+import random
+
+
+def sample_positions(record_count, sample_size, edge_size=10, seed=None):
+    """
+    Function: sample_positions
+
+    Purpose: Choose the (zero based) positions of the records to validate.
+
+    The first and last edge_size records are always included, since header
+    and end of file problems are common. The rest of the sample is
+    stratified: the records between the edges are split into sample_size
+    equal ranges and one record is chosen at random from each range.
+
+    Arguments:
+        record_count - The number of records in the file
+        sample_size - The number of records to sample between the edges
+        edge_size - The number of records to include from each end
+        seed - Seed for the random number generator
+
+    Returns: A sorted list of the edge record positions, and a sorted list of
+             the stratified record positions
+    """
+    random_generator = random.Random(seed)
+
+    edge_positions = sorted(set(range(min(edge_size, record_count)))
+                            | set(range(max(record_count - edge_size, 0), record_count)))
+
+    middle_start = min(edge_size, record_count)
+    middle_count = max(record_count - 2 * edge_size, 0)
+
+    if middle_count <= sample_size:
+        stratified_positions = list(range(middle_start, middle_start + middle_count))
+    else:
+        stratified_positions = []
+        for stratum in range(sample_size):
+            stratum_start = middle_start + (stratum * middle_count) // sample_size
+            stratum_end = middle_start + ((stratum + 1) * middle_count) // sample_size
+            stratified_positions.append(random_generator.randrange(stratum_start, stratum_end))
+
+    return(edge_positions, stratified_positions)
+
+
+def sample_manifest_file(manifest_file_handle, sample_size, edge_size=10, seed=None):
+    """
+    Function: sample_manifest_file
+
+    Purpose: Copy the header and the sampled records of a csv manifest file
+             into an in-memory file, so that only the sample is parsed into
+             a dataframe.
+
+    The records are counted and picked out with the csv module, which only
+    splits them into fields, so quoted fields that contain line breaks are
+    handled. Blank lines are skipped, as the csv parser does.
+
+    Arguments:
+        manifest_file_handle - File handle for the csv manifest file
+        sample_size - The number of records to sample between the edges
+        edge_size - The number of records to include from each end
+        seed - Seed for the random number generator
+
+    Returns: A text file handle for the sampled records, the number of
+             records in the file, and the edge and stratified record
+             positions as returned by sample_positions
+    """
+    manifest_file_handle.seek(0)
+    # The first row is the header.
+    record_count = max(sum(1 for csv_row in csv.reader(manifest_file_handle) if csv_row) - 1, 0)
+
+    edge_positions, stratified_positions = sample_positions(record_count, sample_size,
+                                                            edge_size=edge_size, seed=seed)
+    sampled_positions = set(edge_positions).union(stratified_positions)
+
+    sample_text = io.StringIO()
+    sample_writer = csv.writer(sample_text, lineterminator="\n")
+
+    manifest_file_handle.seek(0)
+    csv_rows = (csv_row for csv_row in csv.reader(manifest_file_handle) if csv_row)
+    sample_writer.writerow(next(csv_rows, []))
+
+    for position, csv_row in enumerate(csv_rows):
+        if position in sampled_positions:
+            sample_writer.writerow(csv_row)
+            sampled_positions.discard(position)
+            if not sampled_positions:
+                break
+
+    sample_file_handle = io.TextIOWrapper(
+        io.BytesIO(sample_text.getvalue().encode(manifest_file_handle.encoding)),
+        encoding=manifest_file_handle.encoding)
+
+    return(sample_file_handle, record_count, edge_positions, stratified_positions)
+
+
+def wilson_interval(failures, total, z=1.96):
+    """
+    Function: wilson_interval
+
+    Purpose: Return the Wilson score confidence interval for a proportion.
+             It behaves well for the small failure counts and proportions
+             close to zero that are typical of a sample.
+
+    Arguments:
+        failures - The number of failures in the sample
+        total - The sample size
+        z - The normal quantile for the confidence level (1.96 for 95%)
+
+    Returns: The lower and upper bounds of the interval
+    """
+    if total == 0:
+        return(0.0, 1.0)
+
+    proportion = failures / total
+    denominator = 1 + z * z / total
+    center = (proportion + z * z / (2 * total)) / denominator
+    margin = (z * math.sqrt(proportion * (1 - proportion) / total
+                            + z * z / (4 * total * total))) / denominator
+
+    return(max(0.0, center - margin), min(1.0, center + margin))
+
+
+class SampleSummary:
+    """
+    Class: SampleSummary
+
+    Purpose: Collect the errors found in a sample of records, and report the
+             observed error types and the estimated failure rate of each
+             column.
+
+    Only the stratified records are used for the estimates. The records from
+    the edges of the file are not a random sample, but the errors found in
+    them are still listed.
+    """
+
+    def __init__(self, record_count, column_keys=()):
+        """
+        Arguments:
+            record_count - The number of records in the file
+            column_keys - The (schema label, column) pairs to estimate the
+                          failure rate for, even if no sampled record fails
+        """
+        self.record_count = record_count
+        self.edge_records = 0
+        self.estimate_records = 0
+        self.failed_records = 0
+        # (label, column) -> number of stratified records with errors
+        self.column_failures = {column_key: 0 for column_key in column_keys}
+        # (label, column, keyword) -> [number of errors, example message]
+        self.error_types = {}
+
+    def add(self, record_errors, schema_labels, is_estimate):
+        """
+        Add the errors for a sampled record.
+
+        Arguments:
+            record_errors - A list with the list of jsonschema errors for each
+                            schema
+            schema_labels - A list of the label for each schema
+            is_estimate - True if the record is part of the stratified sample
+        """
+        record_failed = False
+
+        for schema_errors, schema_label in zip(record_errors, schema_labels):
+            failed_columns = set()
+
+            for error in schema_errors:
+                if error.relative_schema_path[0] == "properties":
+                    column = error.relative_schema_path[1]
+                else:
+                    column = "(record)"
+                failed_columns.add(column)
+
+                error_type = self.error_types.setdefault((schema_label, column, error.validator),
+                                                         [0, error.message])
+                error_type[0] += 1
+
+            if is_estimate:
+                for column in failed_columns:
+                    column_key = (schema_label, column)
+                    self.column_failures[column_key] = self.column_failures.get(column_key, 0) + 1
+
+            record_failed = record_failed or bool(failed_columns)
+
+        if is_estimate:
+            self.estimate_records += 1
+            self.failed_records += record_failed
+        else:
+            self.edge_records += 1
+
+    def report(self):
+        """
+        Create the sample report.
+
+        Returns: A string containing the report
+        """
+        def rate_string(failures):
+            low, high = wilson_interval(failures, self.estimate_records)
+            rate = failures / self.estimate_records if self.estimate_records else 0.0
+            return f"{rate:.1%} (95% CI {low:.1%}-{high:.1%})"
+
+        report_string = (f"Sample: {self.estimate_records + self.edge_records} of "
+                         f"{self.record_count} records ({self.estimate_records} stratified, "
+                         f"{self.edge_records} from the start and end of the file)\n")
+
+        if self.estimate_records:
+            report_string += f"Estimated record failure rate: {rate_string(self.failed_records)}\n"
+
+            if self.column_failures:
+                report_string += "Estimated failure rate by column:\n"
+                for (schema_label, column), failures in sorted(self.column_failures.items(),
+                                                               key=lambda item: -item[1]):
+                    report_string += f"  {schema_label}{column}: {rate_string(failures)}\n"
+
+        if self.error_types:
+            report_string += "Observed errors:\n"
+            for (schema_label, column, keyword), (count, message) in sorted(
+                    self.error_types.items(), key=lambda item: -item[1][0]):
+                report_string += (f"  {schema_label}{column}: {keyword}: {count} "
+                                  f"{'error' if count == 1 else 'errors'}, e.g. {message}\n")
+
+        return report_string
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"""
+Program: schema_registry.py
+
+Purpose: An in-process registry of JSON validation schemas for programs that
+         validate against many schemas, e.g. a worker handling several
+         projects. Schemas are loaded, dereferenced and compiled into
+         validators on demand, and the most recently used ones are kept.
+
+Usage:
+    registry = SchemaRegistry(max_size=32)
+    registry.register("biospecimen", "/path/to/biospecimen.json", version="2")
+    for record_number, errors in registry.validate_records(records,
+                                                           "biospecimen",
+                                                           version="2"):
+        ...
+
+"""
+
+import collections
+import os
+import threading
+import schema_tools
+
+
+CompiledSchema = collections.namedtuple(
+    "CompiledSchema",
+    ["json_schema", "ref_location_dict", "validator", "string_columns", "mixed_columns"])
+
+
+class SchemaRegistry:
+    """
+    Class: SchemaRegistry
+
+    Purpose: Look up compiled schemas by name (and optionally version) or by
+             file path, keeping a bounded least recently used cache of them.
+
+    Each cache entry is a CompiledSchema holding the dereferenced schema, the
+    reference locations, a validator from schema_tools.create_validator and
+    the column lists from schema_tools.get_string_columns.
+
+    Lookups are thread-safe. A schema that is not cached is loaded outside the
+    lock, so a slow load does not block lookups of other schemas.
+    """
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self.schema_files = {}
+        # (name, version) -> number of times the name and version have been
+        # registered, so that a load started before a register() is not
+        # cached after it.
+        self.generations = {}
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def register(self, name, schema_file_name, version=None):
+        """
+        Register the file for a schema name and version. Registering a new
+        file for a name and version removes any cached copy.
+        """
+        with self.lock:
+            self.schema_files[(name, version)] = os.path.abspath(schema_file_name)
+            self.generations[(name, version)] = self.generations.get((name, version), 0) + 1
+            self.cache.pop((name, version), None)
+
+    def _schema_key(self, name, version):
+        if (name, version) in self.schema_files:
+            return (name, version), self.schema_files[(name, version)]
+
+        if (version is None) and os.path.isfile(name):
+            schema_file_name = os.path.abspath(name)
+            return (schema_file_name, None), schema_file_name
+
+        raise KeyError(f"Schema not registered: {name} (version {version})")
+
+    def get(self, name, version=None):
+        """
+        Return the CompiledSchema for a registered name and version, or for
+        the path of a schema file.
+        """
+        with self.lock:
+            schema_key, schema_file_name = self._schema_key(name, version)
+            compiled_schema = self.cache.get(schema_key)
+            if compiled_schema is not None:
+                self.cache.move_to_end(schema_key)
+                self.hits += 1
+                return compiled_schema
+            self.misses += 1
+            generation = self.generations.get(schema_key)
+
+        with open(schema_file_name, "r") as schema_file:
+            ref_location_dict, json_schema = schema_tools.load_and_deref(schema_file)
+        string_columns, mixed_columns = schema_tools.get_string_columns(json_schema)
+        compiled_schema = CompiledSchema(json_schema, ref_location_dict,
+                                         schema_tools.create_validator(json_schema),
+                                         string_columns, mixed_columns)
+
+        with self.lock:
+            # The name may have been registered to another file while the
+            # schema was loading. The schema is still returned to this
+            # caller, who asked before the change, but not cached.
+            if self.generations.get(schema_key) != generation:
+                return compiled_schema
+
+            # Another thread may have loaded the schema in the meantime.
+            if schema_key in self.cache:
+                self.cache.move_to_end(schema_key)
+                return self.cache[schema_key]
+
+            self.cache[schema_key] = compiled_schema
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+
+        return compiled_schema
+
+    def validate_records(self, records, name, version=None, first_record=1):
+        """
+        Validate records against a schema.
+
+        Arguments:
+            records - An iterable of dictionaries or mappings
+            name - A registered schema name, or the path of a schema file
+            version - The registered schema version
+            first_record - The number of the first record
+
+        Returns: A generator of (record number, list of jsonschema
+                 ValidationError objects) tuples for the records that have
+                 errors
+        """
+        compiled_schema = self.get(name, version)
+        column_converters = dict(zip(compiled_schema.mixed_columns,
+                                     schema_tools.get_column_converters(
+                                         compiled_schema.json_schema,
+                                         compiled_schema.mixed_columns)))
+
+        for record_number, record in enumerate(records, first_record):
+            # Remove any None values from the dictionary, and convert Booleans
+            # to strings in columns that are also allowed to contain strings.
+            if isinstance(record, dict):
+                record = {k: (column_converters[k](v) if k in column_converters else v)
+                          for k, v in record.items() if v is not None}
+
+            schema_errors = list(compiled_schema.validator.iter_errors(record))
+            if schema_errors:
+                yield record_number, schema_errors
+
+    def stats(self):
+        """
+        Return a dictionary of the cache size, hits, misses and evictions.
+        """
+        with self.lock:
+            return {"size": len(self.cache),
+                    "max_size": self.max_size,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions}
+
+    def clear(self):
+        """
+        Remove all cached schemas. Registrations are kept.
+        """
+        with self.lock:
+            self.cache.clear()
@@ -7,9 +7,15 @@ Purpose: Common functions used by validation or template generation programs.
 
 """
 
+import collections.abc
+import functools
+import heapq
+import itertools
+
 VALUES_LIST_KEYWORDS = ["anyOf", "enum"]
+SCHEMA_MAP_KEYWORDS = ["properties", "patternProperties", "definitions", "dependencies"]
 
-def convert_bool_to_string(input_value):
+def convert_bool_to_string(input_value, allowed_booleans=()):
 
     """
     Function: convert_bool_to_string
@@ -17,7 +23,9 @@ def convert_bool_to_string(input_value):
     Purpose: Convert a value from the Python Boolean representation (True/False)
              into a lower case string representation (true/false).
 
-    Arguments: A variable that might contain a Python Boolean value
+    Arguments: A variable that might contain a Python Boolean value, and
+               optionally the Boolean values that are left as they are
+               because they are valid values themselves.
 
     Returns: Either a) a string representation of a Boolean value if
              the value passed in was a Python Boolean, or b) the original
@@ -28,7 +36,7 @@ def convert_bool_to_string(input_value):
     # Make sure that the input value is a Boolean. Passing a string in
     # will probably not matter, but passing a number into the conversion
     # will convert any 0/1 values into false/true.
-    if isinstance(input_value, bool):
+    if isinstance(input_value, bool) and (input_value not in allowed_booleans):
         return_value = string_conversion.get(input_value, input_value)
     else:
         return_value = input_value
@@ -218,6 +226,613 @@ def convert_string_to_other(data_row, val_schema, type_list, func_to_run):
     return converted_row
 
 
+def is_string_type(schema_type):
+    """
+    Function: is_string_type
+
+    Purpose: Determine if a JSON schema "type" only allows strings, apart
+             from explicit nulls, e.g. "string" or ["string", "null"].
+
+    Arguments:
+        schema_type - The value of a "type" keyword
+
+    Returns: True if the only type other than "null" is "string"
+    """
+    if isinstance(schema_type, list):
+        return [type_name for type_name in schema_type if type_name != "null"] == ["string"]
+
+    return schema_type == "string"
+
+
+def get_allowed_booleans(schema_val):
+    """
+    Function: get_allowed_booleans
+
+    Purpose: Determine which Boolean values a property allows, from a
+             "boolean" type or Boolean constants in its values list.
+
+    Arguments:
+        schema_val - The schema of a property
+
+    Returns: A set of the allowed Boolean values
+    """
+    schema_types = [schema_val.get("type")]
+    list_values = schema_val.get("enum", [])
+
+    if "anyOf" in schema_val:
+        schema_types.extend(value_row.get("type") for value_row in schema_val["anyOf"])
+        list_values = [value_row["const"] for value_row in schema_val["anyOf"]
+                       if "const" in value_row]
+
+    for schema_type in schema_types:
+        if (schema_type == "boolean") or (isinstance(schema_type, list)
+                                          and "boolean" in schema_type):
+            return {True, False}
+
+    return {list_value for list_value in list_values if isinstance(list_value, bool)}
+
+
+def get_string_columns(json_schema):
+    """
+    Function: get_string_columns
+
+    Purpose: Determine from the schema which columns of a manifest file must
+             be read as strings, and which columns may be inferred by the csv
+             parser but need Boolean values converted back into strings.
+
+    A column is read as a string if the property is defined with a "string"
+    type (which may also allow "null"), or if it has a controlled values list
+    that only contains string (or null) values. Reading these columns as strings up front means that values such
+    as "true" or "1" are never inferred as Boolean or numeric values, so they
+    do not have to be converted back into strings before validation.
+
+    A column whose values list mixes string constants with other types is
+    left to the parser to infer. Unless both Booleans are allowed values (as
+    constants or with a "boolean" type), it is also "mixed": Boolean values
+    that are not allowed are converted to strings in the same way as
+    convert_from_other.
+
+    Arguments:
+        json_schema - A dereferenced JSON schema in dictionary form
+
+    Returns: A list of the columns to be read as strings, and a list of the
+             mixed columns
+    """
+    string_columns = []
+    mixed_columns = []
+
+    for schema_key, schema_val in json_schema["properties"].items():
+        if not schema_val:
+            continue
+
+        if is_string_type(schema_val.get("type")):
+            string_columns.append(schema_key)
+
+        elif any(value_key in schema_val for value_key in VALUES_LIST_KEYWORDS):
+            vkey = list(set(VALUES_LIST_KEYWORDS).intersection(schema_val))[0]
+
+            # "enum" lists contain the values themselves, "anyOf" lists
+            # contain subschemas.
+            if vkey == "enum":
+                list_values = schema_val[vkey]
+                list_types = []
+            else:
+                list_values = [value_row["const"] for value_row in schema_val[vkey]
+                               if "const" in value_row]
+                list_types = [value_row["type"] for value_row in schema_val[vkey]
+                              if "type" in value_row]
+
+            # Explicit nulls are allowed alongside the strings.
+            list_values = [list_value for list_value in list_values if list_value is not None]
+            list_types = [list_type for list_type in list_types if list_type != "null"]
+
+            has_string = (any(isinstance(list_value, str) for list_value in list_values)
+                          or any(is_string_type(list_type) for list_type in list_types))
+            all_string = (all(isinstance(list_value, str) for list_value in list_values)
+                          and all(is_string_type(list_type) for list_type in list_types))
+
+            # Booleans are only converted to strings if they are not valid
+            # values themselves.
+            if has_string and all_string:
+                string_columns.append(schema_key)
+            elif has_string and (get_allowed_booleans(schema_val) != {True, False}):
+                mixed_columns.append(schema_key)
+
+    return(string_columns, mixed_columns)
+
+
+def read_manifest(manifest_file_handle, json_schema, use_pyarrow=False,
+                  string_columns=None, columns=None):
+    """
+    Function: read_manifest
+
+    Purpose: Read a csv manifest file into a pandas dataframe using column
+             types taken from the JSON validation schema.
+
+    Arguments:
+        manifest_file_handle - File handle for the csv manifest file
+        json_schema - A dereferenced JSON schema in dictionary form
+        use_pyarrow - If True, use the multithreaded pyarrow csv parser.
+                      Requires pyarrow.
+        string_columns - The columns to read as strings, if not the ones
+                         from get_string_columns for the schema
+        columns - The columns to read, if not all of them
+
+    Returns: A pandas dataframe. Empty fields are left as null values, and
+             Booleans in mixed columns are not yet converted; use
+             manifest_records to iterate over the records.
+    """
+    import pandas as pd
+
+    if string_columns is None:
+        string_columns, _ = get_string_columns(json_schema)
+
+    if use_pyarrow:
+        import pyarrow
+        from pyarrow import csv as pyarrow_csv
+
+        # pyarrow reads empty string fields as empty strings unless told
+        # otherwise.
+        convert_options = pyarrow_csv.ConvertOptions(
+            column_types={column: pyarrow.string() for column in string_columns},
+            strings_can_be_null=True,
+            include_columns=columns)
+
+        # pyarrow needs the underlying binary file.
+        manifest_table = pyarrow_csv.read_csv(manifest_file_handle.buffer,
+                                              convert_options=convert_options)
+        manifest_df = manifest_table.to_pandas()
+
+    else:
+        # Only pass types for columns that are actually in the file.
+        manifest_columns = pd.read_csv(manifest_file_handle, nrows=0).columns
+        manifest_file_handle.seek(0)
+
+        manifest_df = pd.read_csv(manifest_file_handle,
+                                  dtype={column: str for column in string_columns
+                                         if column in manifest_columns},
+                                  usecols=columns)
+
+    return manifest_df
+
+
+def read_manifest_chunks(manifest_file_handle, use_pyarrow=False, chunk_size=10000):
+    """
+    Function: read_manifest_chunks
+
+    Purpose: Read a csv manifest file as a series of pandas dataframes of
+             chunk_size records, with every column read as strings.
+
+    The file is read as it is needed, so reading and parsing can overlap
+    with validation. Types cannot be inferred for a whole column without
+    reading the whole file, so the columns are read as strings and
+    get_column_types and convert_column_types are used to convert the ones
+    that are not strings in a schema. The pyarrow parser uses its streaming
+    reader, which parses blocks of the file using multiple threads.
+
+    Arguments:
+        manifest_file_handle - File handle for the csv manifest file
+        use_pyarrow - If True, use the multithreaded pyarrow csv parser.
+                      Requires pyarrow.
+        chunk_size - The number of records in each chunk
+
+    Returns: A generator of pandas dataframes, with the row labels of the
+             whole file
+    """
+    import pandas as pd
+
+    if not use_pyarrow:
+        yield from pd.read_csv(manifest_file_handle, dtype=str, chunksize=chunk_size)
+        return
+
+    import pyarrow
+    from pyarrow import csv as pyarrow_csv
+
+    manifest_columns = pd.read_csv(manifest_file_handle, nrows=0).columns
+    manifest_file_handle.seek(0)
+
+    convert_options = pyarrow_csv.ConvertOptions(
+        column_types={column: pyarrow.string() for column in manifest_columns},
+        strings_can_be_null=True)
+    batch_reader = pyarrow_csv.open_csv(manifest_file_handle.buffer,
+                                        convert_options=convert_options)
+
+    # The reader returns a batch for each block of the file, so the batches
+    # are joined or split into chunks of chunk_size records.
+    pending_tables = []
+    pending_rows = 0
+    chunk_start = 0
+
+    for record_batch in itertools.chain(batch_reader, [None]):
+        if record_batch is not None:
+            pending_tables.append(pyarrow.Table.from_batches([record_batch]))
+            pending_rows += record_batch.num_rows
+            if pending_rows < chunk_size:
+                continue
+        elif pending_rows == 0:
+            return
+
+        pending_table = pyarrow.concat_tables(pending_tables)
+
+        # At the end of the file, the last chunk can be smaller.
+        while (pending_table.num_rows >= chunk_size) or (record_batch is None
+                                                         and pending_table.num_rows):
+            manifest_df = pending_table.slice(0, chunk_size).to_pandas()
+            manifest_df.index = pd.RangeIndex(chunk_start, chunk_start + len(manifest_df))
+            chunk_start += len(manifest_df)
+            pending_table = pending_table.slice(chunk_size)
+            yield manifest_df
+
+        pending_tables = [pending_table]
+        pending_rows = pending_table.num_rows
+
+
+def get_column_types(manifest_file_handle, json_schemas, type_records=10000):
+    """
+    Function: get_column_types
+
+    Purpose: Determine the types to convert the columns of a manifest file
+             to, when the file is read as strings by read_manifest_chunks.
+
+    The types are the ones the pandas csv parser infers from the first
+    type_records records, so they do not depend on the chunk size. Unlike a
+    read of the whole file, a later value that does not have the type of its
+    column is left as a string, rather than turning the whole column into
+    strings.
+
+    Arguments:
+        manifest_file_handle - File handle for the csv manifest file
+        json_schemas - A list of dereferenced JSON schemas
+        type_records - The number of records to infer the types from
+
+    Returns: A dictionary of column names and "boolean", "integer" or
+             "number", for the columns that are not strings in at least one
+             schema and do not contain strings
+    """
+    import pandas as pd
+
+    manifest_file_handle.seek(0)
+    manifest_columns = pd.read_csv(manifest_file_handle, nrows=0).columns
+
+    schema_string_columns = [get_string_columns(json_schema)[0] for json_schema in json_schemas]
+    inferred_columns = [column for column in manifest_columns
+                        if any(column not in columns for columns in schema_string_columns)]
+
+    column_types = {}
+    if not inferred_columns:
+        return column_types
+
+    manifest_file_handle.seek(0)
+    head_df = pd.read_csv(manifest_file_handle, usecols=inferred_columns, nrows=type_records)
+
+    for column in inferred_columns:
+        column_values = head_df[column]
+        if pd.api.types.is_bool_dtype(column_values):
+            column_types[column] = "boolean"
+        elif pd.api.types.is_integer_dtype(column_values):
+            column_types[column] = "integer"
+        elif pd.api.types.is_float_dtype(column_values):
+            column_types[column] = "number"
+        elif (column_values.notna().any()
+              and all(isinstance(column_value, bool) for column_value in column_values.dropna())):
+            # Booleans with empty fields are inferred as objects.
+            column_types[column] = "boolean"
+
+    return column_types
+
+
+def convert_column_types(manifest_df, column_types):
+    """
+    Function: convert_column_types
+
+    Purpose: Convert the string columns of a chunk from read_manifest_chunks
+             to the types from get_column_types. Values are converted with
+             the pandas parser's rules; values that cannot be converted are
+             left as strings.
+
+    Arguments:
+        manifest_df - A pandas dataframe read as strings
+        column_types - A dictionary of column names and types, as returned
+                       by get_column_types
+
+    Returns: A pandas dataframe with the converted columns, or None if there
+             are none. It can be passed to ManifestColumns.for_schema.
+    """
+    import pandas as pd
+
+    converted_columns = {}
+
+    for column, column_type in column_types.items():
+        if column not in manifest_df.columns:
+            continue
+
+        column_values = manifest_df[column]
+        if column_type == "boolean":
+            converted_values = column_values.str.lower().map({"true": True, "false": False})
+        else:
+            converted_values = pd.to_numeric(column_values, errors="coerce")
+
+        column_list = []
+        for column_value, converted_value in zip(column_values.tolist(),
+                                                 converted_values.tolist()):
+            if pd.isna(converted_value):
+                column_list.append(column_value)
+            elif (column_type == "integer") and float(converted_value).is_integer():
+                column_list.append(int(converted_value))
+            else:
+                column_list.append(converted_value)
+
+        converted_columns[column] = pd.Series(column_list, index=manifest_df.index, dtype=object)
+
+    if not converted_columns:
+        return None
+
+    return pd.DataFrame(converted_columns)
+
+
+def get_shared_string_columns(json_schemas):
+    """
+    Function: get_shared_string_columns
+
+    Purpose: Determine which columns of a manifest file to read as strings
+             when the file is validated against several schemas.
+
+    A column is read as a string if any of the schemas needs it as a string.
+    For the schemas that do not, read_inferred_columns reads the column again
+    with the types the csv parser infers.
+
+    Arguments:
+        json_schemas - A list of dereferenced JSON schemas
+
+    Returns: A list of the columns to be read as strings
+    """
+    shared_string_columns = []
+
+    for json_schema in json_schemas:
+        string_columns, _ = get_string_columns(json_schema)
+        shared_string_columns.extend(column for column in string_columns
+                                     if column not in shared_string_columns)
+
+    return shared_string_columns
+
+
+def read_inferred_columns(manifest_file_handle, json_schemas, use_pyarrow=False,
+                          string_columns=None):
+    """
+    Function: read_inferred_columns
+
+    Purpose: Read again the columns of a manifest file that were read as
+             strings for one schema, but are not strings in another one.
+
+    The columns are read with the types the csv parser infers for the whole
+    column, so that each schema sees the same values as it would if the file
+    was validated against that schema alone.
+
+    Arguments:
+        manifest_file_handle - File handle for the csv manifest file
+        json_schemas - A list of dereferenced JSON schemas
+        use_pyarrow - If True, use the multithreaded pyarrow csv parser.
+                      Requires pyarrow.
+        string_columns - The columns that were read as strings, if not the
+                         ones from get_shared_string_columns for the schemas
+
+    Returns: A pandas dataframe with the columns, or None if the schemas
+             agree on all the columns that were read as strings
+    """
+    import pandas as pd
+
+    if string_columns is None:
+        string_columns = get_shared_string_columns(json_schemas)
+
+    manifest_file_handle.seek(0)
+    manifest_columns = pd.read_csv(manifest_file_handle, nrows=0).columns
+
+    schema_string_columns = [get_string_columns(json_schema)[0] for json_schema in json_schemas]
+    inferred_columns = [column for column in manifest_columns
+                        if (column in string_columns)
+                        and any(column not in columns for columns in schema_string_columns)]
+
+    if not inferred_columns:
+        return None
+
+    manifest_file_handle.seek(0)
+
+    return read_manifest(manifest_file_handle, json_schemas[0], use_pyarrow=use_pyarrow,
+                         string_columns=[], columns=inferred_columns)
+
+
+def get_column_converters(json_schema, columns):
+    """
+    Function: get_column_converters
+
+    Purpose: Return the conversion to apply to each column of a manifest when
+             its values are read for validation against a schema.
+
+    We are not currently allowing multiple types in reference definitions,
+    so Booleans are converted to strings if the column is also allowed to
+    contain string values.
+
+    Arguments:
+        json_schema - A dereferenced JSON schema in dictionary form
+        columns - A list of the manifest column names
+
+    Returns: A list with a conversion function, or None, for each column
+    """
+    _, mixed_columns = get_string_columns(json_schema)
+    column_converters = []
+
+    for column in columns:
+        if column not in mixed_columns:
+            column_converters.append(None)
+            continue
+
+        # A Boolean that is itself an allowed value is left as it is.
+        allowed_booleans = get_allowed_booleans(json_schema["properties"][column])
+        if allowed_booleans:
+            column_converters.append(functools.partial(convert_bool_to_string,
+                                                       allowed_booleans=allowed_booleans))
+        else:
+            column_converters.append(convert_bool_to_string)
+
+    return column_converters
+
+
+class ManifestColumns:
+    """
+    Class: ManifestColumns
+
+    Purpose: Hold the columns of a manifest dataframe as Python lists, along
+             with the null flags and the conversion to apply to each column.
+             The records are read through ManifestRow views, which share the
+             column lists and the column name index.
+    """
+
+    __slots__ = ("columns", "column_index", "column_values", "column_nulls",
+                 "column_converters", "row_count")
+
+    def __init__(self, manifest_df, json_schema):
+        self.columns = manifest_df.columns.tolist()
+        self.column_index = {column: index for index, column in enumerate(self.columns)}
+        self.column_values = [manifest_df[column].tolist() for column in self.columns]
+        self.column_nulls = [manifest_df[column].isna().tolist() for column in self.columns]
+        self.row_count = len(manifest_df)
+
+        # The conversions are applied when the values are read.
+        self.column_converters = get_column_converters(json_schema, self.columns)
+
+    def for_schema(self, json_schema, inferred_df=None):
+        """
+        Return a ManifestColumns object that shares the column lists with
+        this one, but converts the values for a different schema. Columns of
+        inferred_df (as returned by read_inferred_columns) that are not
+        strings in the schema replace the ones read as strings. This object
+        should hold the columns as read, so that each schema starts from the
+        same values.
+        """
+        manifest_columns = ManifestColumns.__new__(ManifestColumns)
+        manifest_columns.columns = self.columns
+        manifest_columns.column_index = self.column_index
+        manifest_columns.column_values = self.column_values
+        manifest_columns.column_nulls = self.column_nulls
+        manifest_columns.row_count = self.row_count
+        manifest_columns._use_inferred_columns(json_schema, inferred_df)
+        manifest_columns.column_converters = get_column_converters(json_schema, self.columns)
+        return manifest_columns
+
+    def _use_inferred_columns(self, json_schema, inferred_df):
+        if inferred_df is None:
+            return
+
+        string_columns, _ = get_string_columns(json_schema)
+        inferred_columns = [column for column in inferred_df.columns
+                            if (column in self.column_index) and (column not in string_columns)]
+        if not inferred_columns:
+            return
+
+        # Copy the lists of columns, not the columns, so that the other
+        # schemas still see the string values.
+        self.column_values = list(self.column_values)
+        self.column_nulls = list(self.column_nulls)
+
+        for column in inferred_columns:
+            column_number = self.column_index[column]
+            self.column_values[column_number] = inferred_df[column].tolist()
+            self.column_nulls[column_number] = inferred_df[column].isna().tolist()
+
+    def row(self, row_number):
+        """
+        Return a ManifestRow view of the record at the given (zero based)
+        position.
+        """
+        return ManifestRow(self, row_number)
+
+    def rows(self):
+        """
+        Return a generator of ManifestRow views, one per record.
+        """
+        for row_number in range(self.row_count):
+            yield ManifestRow(self, row_number)
+
+    # The object can also be used as a sequence of records.
+    def __len__(self):
+        return self.row_count
+
+    def __getitem__(self, row_number):
+        if not 0 <= row_number < self.row_count:
+            raise IndexError(row_number)
+        return ManifestRow(self, row_number)
+
+    def __iter__(self):
+        return self.rows()
+
+
+class ManifestRow(collections.abc.Mapping):
+    """
+    Class: ManifestRow
+
+    Purpose: A read-only dictionary view of a single manifest record.
+
+    Null values are left out of the view - it simplifies the coding of the
+    JSON validation schema. The view can be passed to a validator created by
+    create_validator, which accepts any mapping as a JSON object.
+    """
+
+    __slots__ = ("_manifest_columns", "_row_number")
+
+    def __init__(self, manifest_columns, row_number):
+        self._manifest_columns = manifest_columns
+        self._row_number = row_number
+
+    def __getitem__(self, column):
+        manifest_columns = self._manifest_columns
+        column_number = manifest_columns.column_index[column]
+
+        if manifest_columns.column_nulls[column_number][self._row_number]:
+            raise KeyError(column)
+
+        value = manifest_columns.column_values[column_number][self._row_number]
+        converter = manifest_columns.column_converters[column_number]
+
+        return converter(value) if converter else value
+
+    def __contains__(self, column):
+        # Mapping.__contains__ would read (and convert) the value.
+        manifest_columns = self._manifest_columns
+        column_number = manifest_columns.column_index.get(column)
+        return ((column_number is not None)
+                and (not manifest_columns.column_nulls[column_number][self._row_number]))
+
+    def __iter__(self):
+        manifest_columns = self._manifest_columns
+        for column, column_nulls in zip(manifest_columns.columns,
+                                        manifest_columns.column_nulls):
+            if not column_nulls[self._row_number]:
+                yield column
+
+    def __len__(self):
+        return sum(not column_nulls[self._row_number]
+                   for column_nulls in self._manifest_columns.column_nulls)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def manifest_records(manifest_df, json_schema):
+    """
+    Function: manifest_records
+
+    Purpose: Iterate over the records of a manifest dataframe as mappings
+             suitable for validation.
+
+    Arguments:
+        manifest_df - A pandas dataframe as returned by read_manifest
+        json_schema - A dereferenced JSON schema in dictionary form
+
+    Returns: A generator of ManifestRow views, one per record
+    """
+    return ManifestColumns(manifest_df, json_schema).rows()
+
+
 def get_definitions_values(json_schema):
     """
     Function: get_definitions_values
@@ -243,10 +858,12 @@ def get_definitions_values(json_schema):
     """
     import pandas as pd
 
+    # The rows are collected as dictionaries and the dataframes created at
+    # the end; DataFrame.append was removed in pandas 2.
     definitions_columns = ["key", "type", "description", "required", "maximumSize"]
-    definitions_df = pd.DataFrame(columns=definitions_columns)
+    definitions_rows = []
     values_columns = ["key", "value", "valueDescription", "source"]
-    values_df = pd.DataFrame(columns=values_columns)
+    values_rows = []
 
     for schema_key in json_schema["properties"].keys():
         definitions_dict = {}
@@ -268,13 +885,13 @@ def get_definitions_values(json_schema):
             else:
                 definitions_dict["required"] = False
 
-            definitions_df = definitions_df.append(definitions_dict, ignore_index=True)
+            definitions_rows.append(definitions_dict)
 
             values_dict = {}
             if "pattern" in schema_values:
                 values_dict["key"] = schema_key
                 values_dict["value"] = schema_values["pattern"]
-                values_df = values_df.append(values_dict, ignore_index=True)
+                values_rows.append(values_dict)
 
             elif any([value_key in schema_values for value_key in VALUES_LIST_KEYWORDS]):
                 vkey = list(set(VALUES_LIST_KEYWORDS).intersection(schema_values))[0]
@@ -290,9 +907,12 @@ def get_definitions_values(json_schema):
                     if "source" in value_row:
                         values_dict["source"] = value_row["source"]
 
-                    values_df = values_df.append(values_dict, ignore_index=True)
+                    values_rows.append(values_dict)
                     values_dict = {}
 
+    definitions_df = pd.DataFrame(definitions_rows, columns=definitions_columns)
+    values_df = pd.DataFrame(values_rows, columns=values_columns)
+
     return(definitions_df, values_df)
 
 
@@ -366,6 +986,31 @@ def get_schema_properties(json_schema):
     return(definitions_dict, values_dict)
 
 
+def get_module_names(ref_location_dict):
+    """
+    Function: get_module_names
+
+    Purpose: Derive the name of the annotations module for each key from the
+             location of its reference.
+
+    Arguments: A dictionary of keys and the full path of their object
+               references, as returned by load_and_deref
+
+    Returns: A dictionary of keys and module names
+    """
+    import os
+    from urllib.parse import urldefrag
+
+    module_dict = {}
+
+    for schema_key in ref_location_dict:
+        ref_doc, _ = urldefrag(ref_location_dict[schema_key])
+        _, ref_file = os.path.split(ref_doc)
+        module_dict[schema_key] = os.path.splitext(ref_file)[0]
+
+    return module_dict
+
+
 def load_and_deref(schema_file_handle):
     """
     Function: load_and_deref
@@ -403,6 +1048,151 @@ def load_and_deref(schema_file_handle):
     return(ref_location_dict, json_schema)
 
 
+def const_key(const_value):
+    """
+    Function: const_key
+
+    Purpose: Return a hashable key for a constant value that follows JSON
+             schema equality rules, i.e. Booleans are not equal to 0/1 but
+             integers are equal to floats of the same value.
+
+    Arguments: A constant value from a schema or a value to be validated
+
+    Returns: A tuple that can be used as a set member
+    """
+    return (isinstance(const_value, bool), const_value)
+
+
+def get_const_sets(json_schema):
+    """
+    Function: get_const_sets
+
+    Purpose: Find the "anyOf" and "enum" lists in a schema that contain
+             only constant values, and build a set of the allowed values for
+             each of them.
+
+    An "anyOf" subschema counts as a constant if "const" is its only
+    validation keyword. Annotations such as "description" and "source" are
+    allowed. Lists containing anything else, or values that cannot be hashed,
+    are left for jsonschema to validate.
+
+    Arguments:
+        json_schema - A dereferenced JSON schema in dictionary form
+
+    Returns: A dictionary keyed by the id() of each constant list. The value is
+             a tuple of the list itself (to guard against id reuse) and the
+             set of keys of the allowed values.
+    """
+    import jsonschema
+
+    validation_keywords = jsonschema.Draft7Validator.VALIDATORS
+    const_sets = {}
+    schema_stack = [json_schema]
+
+    while schema_stack:
+        schema_obj = schema_stack.pop()
+
+        if isinstance(schema_obj, list):
+            schema_stack.extend(schema_obj)
+            continue
+        if not isinstance(schema_obj, dict):
+            continue
+
+        for schema_key, schema_val in schema_obj.items():
+            # The keys of these are names, e.g. a property called "enum",
+            # and the values are subschemas.
+            if (schema_key in SCHEMA_MAP_KEYWORDS) and isinstance(schema_val, dict):
+                schema_stack.extend(schema_val.values())
+                continue
+
+            if (schema_key == "anyOf") and isinstance(schema_val, list):
+                if all(isinstance(value_row, dict) and ("const" in value_row)
+                       and not any(row_key in validation_keywords
+                                   for row_key in value_row if row_key != "const")
+                       for value_row in schema_val):
+                    try:
+                        const_sets[id(schema_val)] = (
+                            schema_val,
+                            frozenset(const_key(value_row["const"]) for value_row in schema_val))
+                    except TypeError:
+                        pass
+
+            elif (schema_key == "enum") and isinstance(schema_val, list):
+                try:
+                    const_sets[id(schema_val)] = (
+                        schema_val,
+                        frozenset(const_key(enum_value) for enum_value in schema_val))
+                except TypeError:
+                    pass
+
+            # "enum" and "const" values are data, not subschemas.
+            if schema_key not in ("enum", "const"):
+                schema_stack.append(schema_val)
+
+    return const_sets
+
+
+def create_validator(json_schema):
+    """
+    Function: create_validator
+
+    Purpose: Create a Draft 7 validator for the schema that checks constant
+             "anyOf" and "enum" lists with a set lookup.
+
+    jsonschema checks an "anyOf" list by validating against every subschema
+    in turn, which is slow for long controlled vocabulary lists. The lists
+    found by get_const_sets are checked against a precomputed set instead,
+    with the same error message. Any other list is passed to jsonschema.
+
+    The validator also accepts any mapping, e.g. a ManifestRow, as an object.
+
+    Arguments:
+        json_schema - A dereferenced JSON schema in dictionary form
+
+    Returns: A jsonschema validator object
+    """
+    import jsonschema
+
+    const_sets = get_const_sets(json_schema)
+    draft7_any_of = jsonschema.Draft7Validator.VALIDATORS["anyOf"]
+    draft7_enum = jsonschema.Draft7Validator.VALIDATORS["enum"]
+
+    def in_const_set(const_list, instance):
+        const_entry = const_sets.get(id(const_list))
+        if (const_entry is None) or (const_entry[0] is not const_list):
+            return None
+        try:
+            return const_key(instance) in const_entry[1]
+        except TypeError:
+            return False
+
+    def any_of(validator, any_of_list, instance, schema):
+        is_member = in_const_set(any_of_list, instance)
+        if is_member is None:
+            yield from draft7_any_of(validator, any_of_list, instance, schema)
+        elif not is_member:
+            yield jsonschema.ValidationError(
+                f"{instance!r} is not valid under any of the given schemas")
+
+    def enum(validator, enum_list, instance, schema):
+        is_member = in_const_set(enum_list, instance)
+        if is_member is None:
+            yield from draft7_enum(validator, enum_list, instance, schema)
+        elif not is_member:
+            yield jsonschema.ValidationError(f"{instance!r} is not one of {enum_list!r}")
+
+    # Accept any mapping as a JSON object, so that ManifestRow views can be
+    # validated without copying them into dictionaries.
+    type_checker = jsonschema.Draft7Validator.TYPE_CHECKER.redefine(
+        "object", lambda checker, instance: isinstance(instance, collections.abc.Mapping))
+
+    const_set_validator = jsonschema.validators.extend(jsonschema.Draft7Validator,
+                                                       {"anyOf": any_of, "enum": enum},
+                                                       type_checker=type_checker)
+
+    return const_set_validator(json_schema)
+
+
 def validation_errors(schema_errors, **kwargs):
     """
     Function: validation_errors
@@ -443,3 +1233,141 @@ def validation_errors(schema_errors, **kwargs):
             error_string += f"{prepend_string}{error.message}\n"
 
     return error_string
+
+
+class ErrorAggregator:
+    """
+    Class: ErrorAggregator
+
+    Purpose: Group validation errors across records instead of reporting one
+             line per record per error.
+
+    Errors are grouped by column, the schema keyword that was violated, and
+    the offending value. Each group keeps a count and the record numbers in
+    compressed ranges, e.g. "Records 2-98011". Errors that are not tied to a
+    column (e.g. a missing required column) are grouped by message.
+
+    To keep memory bounded, at most max_values values are kept for each
+    column and keyword, using the Space-Saving algorithm: when a new value
+    arrives and the table is full, the value with the lowest count is
+    replaced, and the new value takes over its count. A count is then an
+    upper bound, and the true count is at least the count minus the count
+    taken over, so the summary reports both bounds. Values that occur often
+    are always listed. The record ranges of a replacement value start when
+    it was added. Likewise, at most max_ranges record ranges are kept per
+    group.
+
+    If a label is given, e.g. the name of the schema, it is added to each
+    line after the record numbers.
+    """
+
+    def __init__(self, max_values=1000, max_ranges=20, label=""):
+        self.max_values = max_values
+        self.max_ranges = max_ranges
+        self.label = label
+
+        # (column, keyword) -> {value key: [count, count taken over, message,
+        #                                   ranges]}
+        self.error_groups = {}
+        # (column, keyword) -> heap of (count, insertion number, value key).
+        # Entries whose count is out of date are skipped when the heap is
+        # used to find the value with the lowest count.
+        self.count_heaps = {}
+        self.insertion_number = 0
+
+    def add(self, schema_errors, record_number):
+        """
+        Add the errors from the jsonschema validator for a single record.
+
+        Arguments:
+            schema_errors - The output of the jsonschema validator
+            record_number - The record number the errors belong to
+        """
+        for error in schema_errors:
+            if error.relative_schema_path[0] == "properties":
+                column = error.relative_schema_path[1]
+                try:
+                    value_key = const_key(error.instance)
+                    hash(value_key)
+                except TypeError:
+                    value_key = repr(error.instance)
+            else:
+                column = None
+                value_key = error.message
+
+            group_key = (column, error.validator)
+            value_groups = self.error_groups.setdefault(group_key, {})
+            count_heap = self.count_heaps.setdefault(group_key, [])
+
+            value_group = value_groups.get(value_key)
+            if value_group is None:
+                taken_count = 0
+                if len(value_groups) >= self.max_values:
+                    taken_count = self._replace_minimum(value_groups, count_heap)
+                value_group = [taken_count, taken_count, error.message, []]
+                value_groups[value_key] = value_group
+
+            value_group[0] += 1
+            self.insertion_number += 1
+            heapq.heappush(count_heap, (value_group[0], self.insertion_number, value_key))
+
+            # The heap holds an entry for every increment, so rebuild it from
+            # the current counts when it gets too large.
+            if len(count_heap) > 4 * self.max_values:
+                count_heap[:] = [(group[0], number, key) for number, (key, group)
+                                 in enumerate(value_groups.items())]
+                heapq.heapify(count_heap)
+
+            # Records are added in order, so a record either extends the last
+            # range or starts a new one.
+            ranges = value_group[3]
+            if ranges and (record_number <= ranges[-1][1] + 1):
+                ranges[-1][1] = record_number
+            elif len(ranges) <= self.max_ranges:
+                ranges.append([record_number, record_number])
+
+    @staticmethod
+    def _replace_minimum(value_groups, count_heap):
+        """
+        Remove the value with the lowest count and return its count.
+        """
+        while True:
+            count, _, value_key = heapq.heappop(count_heap)
+            value_group = value_groups.get(value_key)
+            if (value_group is not None) and (value_group[0] == count):
+                del value_groups[value_key]
+                return count
+
+    def summary(self):
+        """
+        Create the aggregated output message.
+
+        Returns: A string with one line per group of errors
+        """
+        error_string = ""
+
+        for group_key in sorted(self.error_groups, key=lambda key: (key[0] is not None,
+                                                                      str(key[0]), key[1])):
+            column, _ = group_key
+            column_prepend = f"{column}: " if column is not None else ""
+            value_groups = self.error_groups[group_key]
+
+            for count, taken_count, message, ranges in sorted(
+                    value_groups.values(), key=lambda value_group: -value_group[0]):
+                range_strings = [f"{start}" if start == end else f"{start}–{end}"
+                                 for start, end in ranges[:self.max_ranges]]
+                if len(ranges) > self.max_ranges:
+                    range_strings.append("...")
+                if (len(ranges) == 1) and (ranges[0][0] == ranges[0][1]):
+                    records_string = "Record"
+                else:
+                    records_string = "Records"
+                if taken_count:
+                    count_string = (f"{count - taken_count} to {count} errors, "
+                                    f"earlier records not listed")
+                else:
+                    count_string = f"{count} {'error' if count == 1 else 'errors'}"
+                error_string += (f"{records_string} {', '.join(range_strings)}: "
+                                 f"{self.label}{column_prepend}{message} ({count_string})\n")
+
+        return error_string
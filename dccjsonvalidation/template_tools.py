@@ -7,8 +7,10 @@ Purpose: Functions used by the template generation programs
 
 """
 
+import json
 import os
 import pandas as pd
+import schema_tools
 
 def template_excel(workbook_name, template_df, dictionary_df, values_df):
     """
@@ -85,3 +87,106 @@ def template_csv(template_file_name, template_df, dictionary_df, values_df):
     # Create a values file
     with open(values_file_name, "w") as values_file:
         values_df.to_csv(values_file, index=False)
+
+
+def dictionary_arrow(dictionary_file_name, dictionary_df, values_df, module_dict,
+                     file_format="parquet"):
+    """
+    Function: dictionary_arrow
+
+    Purpose: Write the dictionary and values tables as typed, columnar files
+             that can be loaded without parsing:
+             - <file name>_dictionary.<ext>: file with the definitions of the
+                   columns, including the annotations module of each column
+             - <file name>_values.<ext>: file with any controlled vocabulary
+                   lists, including the annotations module of each column
+
+    The string columns are dictionary encoded, "required" is a Boolean
+    column and "maximumSize" is an integer column. Values are written as
+    strings, with Booleans written as true/false, and lists (such as a
+    "type" of ["string", "null"]) or objects written as JSON.
+
+    Arguments:
+        dictionary_file_name: Name of the file to output. The dictionary and
+                              values files will append "_dictionary" and
+                              "_values", respectively, after the file name,
+                              and the extension is always .parquet or
+                              .arrow, matching file_format.
+        dictionary_df - A pandas dataframe containing the definition
+                        information for each column
+        values_df - A pandas dataframe of the values lists used by columns
+        module_dict - A dictionary of keys and module names, as returned by
+                      schema_tools.get_module_names
+        file_format - "parquet" for Parquet files, or "arrow" for Arrow IPC
+                      files
+    """
+    import pyarrow as pa
+
+    def string_value(column_value):
+        if isinstance(column_value, (list, dict)):
+            return json.dumps(column_value)
+        if pd.isna(column_value):
+            return None
+        return str(schema_tools.convert_numeric_to_string(
+            schema_tools.convert_bool_to_string(column_value)))
+
+    def string_array(column_values):
+        string_values = [string_value(column_value) for column_value in column_values]
+        return pa.array(string_values, type=pa.string()).dictionary_encode()
+
+    dictionary_table = pa.table({
+        "key": string_array(dictionary_df["key"]),
+        "type": string_array(dictionary_df["type"]),
+        "description": string_array(dictionary_df["description"]),
+        "required": pa.array([bool(required) for required in dictionary_df["required"]],
+                             type=pa.bool_()),
+        "maximumSize": pa.array([None if pd.isna(maximum_size) else int(maximum_size)
+                                 for maximum_size in dictionary_df["maximumSize"]],
+                                type=pa.int64()),
+        "module": string_array([module_dict.get(key) for key in dictionary_df["key"]])})
+
+    values_table = pa.table({
+        "key": string_array(values_df["key"]),
+        "value": string_array(values_df["value"]),
+        "valueDescription": string_array(values_df["valueDescription"]),
+        "source": string_array(values_df["source"]),
+        "module": string_array([module_dict.get(key) for key in values_df["key"]])})
+
+    # The extension has to match the format, since load_dictionary_arrow
+    # relies on it.
+    base_file_name, _ = os.path.splitext(dictionary_file_name)
+    dictionary_table_file_name = base_file_name + "_dictionary." + file_format
+    values_table_file_name = base_file_name + "_values." + file_format
+
+    for table_file_name, table in [(dictionary_table_file_name, dictionary_table),
+                                   (values_table_file_name, values_table)]:
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(table, table_file_name)
+        else:
+            with pa.OSFile(table_file_name, "wb") as table_file:
+                with pa.ipc.new_file(table_file, table.schema) as table_writer:
+                    table_writer.write_table(table)
+
+
+def load_dictionary_arrow(table_file_name):
+    """
+    Function: load_dictionary_arrow
+
+    Purpose: Load a dictionary or values file written by dictionary_arrow.
+
+    The file is memory mapped. An Arrow IPC file is read without copying the
+    data; a Parquet file is decoded from the mapped file.
+
+    Arguments:
+        table_file_name: Name of the Parquet (.parquet) or Arrow IPC file
+
+    Returns: A pyarrow Table
+    """
+    import pyarrow as pa
+
+    if os.path.splitext(table_file_name)[1] == ".parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(table_file_name, memory_map=True)
+
+    return pa.ipc.open_file(pa.memory_map(table_file_name, "r")).read_all()
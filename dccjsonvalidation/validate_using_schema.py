@@ -5,46 +5,181 @@ Program: validate_using_schema.py
 
 Purpose: Validate an object using a JSON Draft 7 schema. If the object to
          be validated is a manifest file, it is assumed to be a csv file.
+         If more than one schema is given, the object is read once and
+         validated against each of them, and the errors are labeled with the
+         name of the schema.
 
-Input parameters: Full pathname to the JSON validation schema
+Input parameters: Full pathname to one or more JSON validation schemas
                   Full pathname to the object to be validated
-                  Optional flag to indicate that the object is a
-                      manifest file.
+                  Optional flag to use the pyarrow csv parser for
+                      manifest files.
+                  Optional flag to group errors across records, and the
+                      maximum number of distinct values to list.
+                  Optional reference manifest files for foreign keys, and
+                      the maximum number of keys to hold in memory.
+                  Optional sample size for a quick check of a sample of the
+                      records, and a flag to continue with a full run.
+                  Optional flag to validate a manifest file in a pipeline of
+                      reader, coercion, validator and writer stages, and the
+                      pipeline settings.
+                  Optional flag to stop after the first record with errors.
 
 Outputs: Terminal output
 
-Execution: validate_using_schema.py <JSON schema> <object to be validated>
-               --manifest_file
+Execution: validate_using_schema.py <JSON schema> [<JSON schema> ...]
+               <object to be validated>
+               --pyarrow --aggregate --max_values <number>
+               --reference_manifest <name>=<manifest file> --max_keys <number>
+               --sample <number> --sample_edges <number> --seed <number>
+               --upgrade
+               --pipeline --chunk_size <number> --workers <number>
+               --queue_size <number> --pipeline_stats --fail_fast
 
 """
 
 import argparse
+import itertools
 import json
-import jsonschema
-import pandas as pd
+import os
+import sys
+import key_tools
+import pipeline_tools
+import sample_tools
 import schema_tools
 
 def main():
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("json_schema_file", type=argparse.FileType("r"),
-                        help="Full pathname for the JSON schema file")
+    parser.add_argument("json_schema_file", type=argparse.FileType("r"), nargs="+",
+                        help="Full pathname for the JSON schema file. More "
+                             "than one schema may be given.")
     parser.add_argument("validation_obj_file", type=argparse.FileType("r"),
                         help="Full pathname for the object to be validated")
+    parser.add_argument("--pyarrow", action="store_true",
+                        help="Use the multithreaded pyarrow csv parser")
+    parser.add_argument("--aggregate", action="store_true",
+                        help="Group errors by column, keyword and value "
+                             "instead of listing them per record")
+    parser.add_argument("--max_values", type=int, default=1000,
+                        help="Maximum number of distinct values to list per "
+                             "column and keyword when aggregating errors")
+    parser.add_argument("--reference_manifest", action="append", default=[],
+                        metavar="NAME=PATH",
+                        help="Manifest file referenced by a foreign key in "
+                             "the schema. May be repeated.")
+    parser.add_argument("--max_keys", type=int, default=1000000,
+                        help="Maximum number of keys per unique or foreign "
+                             "key index to hold in memory before using a "
+                             "temporary database")
+    parser.add_argument("--sample", type=int,
+                        help="Validate a stratified sample of this many "
+                             "records and estimate the failure rates")
+    parser.add_argument("--sample_edges", type=int, default=10,
+                        help="Number of records from the start and from the "
+                             "end of the file to add to the sample")
+    parser.add_argument("--seed", type=int,
+                        help="Seed for choosing the sample")
+    parser.add_argument("--upgrade", action="store_true",
+                        help="After reporting on the sample, validate the "
+                             "rest of the records")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Read, convert and validate a manifest file in "
+                             "concurrent stages. Column types are inferred "
+                             "from the first 10000 records. Cannot be used "
+                             "with --sample.")
+    parser.add_argument("--chunk_size", type=int, default=10000,
+                        help="Number of records passed between pipeline stages")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Number of pipeline validator workers")
+    parser.add_argument("--queue_size", type=int, default=4,
+                        help="Maximum number of chunks waiting between "
+                             "pipeline stages")
+    parser.add_argument("--pipeline_stats", action="store_true",
+                        help="Print pipeline stage statistics to stderr")
+    parser.add_argument("--fail_fast", action="store_true",
+                        help="Stop after the first record with errors")
 
     args = parser.parse_args()
 
+    if args.max_values < 1:
+        parser.error("--max_values must be at least 1")
+
+    if (args.sample is not None) and (args.sample < 1):
+        parser.error("--sample must be at least 1")
+
+    for option in ["chunk_size", "workers", "queue_size"]:
+        if getattr(args, option) < 1:
+            parser.error(f"--{option} must be at least 1")
+
+    if args.pipeline and (args.sample is not None):
+        parser.error("--pipeline cannot be used with --sample")
+
     row_error = ""
     validation_errors = ""
-    data_dict_list = []
+    json_schemas = []
+    schema_validators = []
+    key_checkers = []
+    schema_labels = []
+    error_aggregators = []
+
+    reference_manifests = {}
+    for reference in args.reference_manifest:
+        if "=" not in reference:
+            parser.error(f"--reference_manifest must be NAME=PATH: {reference}")
+        reference_name, reference_file_name = reference.split("=", 1)
+        reference_manifests[reference_name] = reference_file_name
 
-    # Load the JSON schema and create a validator..
-    _, json_schema = schema_tools.load_and_deref(args.json_schema_file)
-    schema_validator = jsonschema.Draft7Validator(json_schema)
+    for json_schema_file in args.json_schema_file:
+        # Load the JSON schema and create a validator. Controlled values lists
+        # are checked using set lookups.
+        _, json_schema = schema_tools.load_and_deref(json_schema_file)
+        json_schemas.append(json_schema)
+
+        missing_manifests = key_tools.missing_reference_manifests(json_schema,
+                                                                  reference_manifests)
+        if missing_manifests:
+            parser.error(f"No --reference_manifest given for foreign key manifest(s) "
+                         f"{', '.join(missing_manifests)} in {json_schema_file.name}")
+        manifest_problems = key_tools.reference_manifest_problems(json_schema,
+                                                                  reference_manifests)
+        if manifest_problems:
+            parser.error(f"Foreign keys in {json_schema_file.name}: "
+                         f"{'; '.join(manifest_problems)}")
+        schema_validators.append(schema_tools.create_validator(json_schema))
+
+        # Create the checker for any unique and foreign keys declared in the
+        # schema. Foreign keys are looked up in the reference manifests.
+        key_checkers.append(key_tools.KeyChecker(json_schema, reference_manifests,
+                                                 max_keys=args.max_keys))
+
+        # Errors are only labeled with the schema name if there is more than
+        # one schema.
+        if len(args.json_schema_file) > 1:
+            schema_name = os.path.splitext(os.path.basename(json_schema_file.name))[0]
+            schema_labels.append(f"{schema_name}: ")
+        else:
+            schema_labels.append("")
+
+        error_aggregators.append(schema_tools.ErrorAggregator(max_values=args.max_values,
+                                                              label=schema_labels[-1]))
 
     # Attempt to read the file to be validated as a JSON file.
     try:
-        data_dict_list.append(json.load(args.validation_obj_file))
+        data_record = json.load(args.validation_obj_file)
+
+        # Remove any None values from the dictionary - it simplifies the
+        # coding of the JSON validation schema.
+        clean_record = {k: data_record[k] for k in data_record if data_record[k] is not None}
+
+        # We are not currently allowing multiple types in reference
+        # definitions, so convert Booleans to strings if the key is also
+        # allowed to contain string values.
+        schema_records = [[schema_tools.convert_from_other(clean_record,
+                               json_schema,
+                               schema_tools.convert_bool_to_string)]
+                          for json_schema in json_schemas]
+        file_columns = list(clean_record)
+        manifest_file = args.validation_obj_file
 
         # The first record in a JSON file will be 1. Note that records in a
         # JSON file can span multiple lines.
@@ -56,39 +191,142 @@ def main():
         # of the file so it is necessary to reset the file position to the
         # beginning in order to attempt to read it as a csv.
         args.validation_obj_file.seek(0)
-        data_file_df = pd.read_csv(args.validation_obj_file)
-
-        # Pandas reads in empty fields as nan. Replace nan with None.
-        data_file_df = data_file_df.replace({pd.np.nan: None})
 
-        data_dict_list = data_file_df.to_dict(orient="records")
+        # The column types are taken from the schemas, so string values are
+        # read as strings and do not need to be converted back. The records
+        # for each schema are read-only views over the same columns that
+        # leave out empty fields.
+        string_columns = schema_tools.get_shared_string_columns(json_schemas)
 
         # The first line of a manifest file (csv) that contains actual data
         # will be row 2 (header is line 1). Records in csv files will not span
         # multiple lines.
         first_record = 2
 
-    for line_number, data_record in enumerate(data_dict_list):
+        # Without --upgrade, only the sampled records are read and parsed.
+        manifest_file = args.validation_obj_file
+        if (args.sample is not None) and not args.upgrade:
+            (manifest_file, record_count, edge_positions,
+             stratified_positions) = sample_tools.sample_manifest_file(
+                 args.validation_obj_file, args.sample, edge_size=args.sample_edges,
+                 seed=args.seed)
 
-        # Remove any None values from the dictionary - it simplifies the
-        # coding of the JSON validation schema.
-        clean_record = {k: data_record[k] for k in data_record if data_record[k] is not None}
+        if args.pipeline:
+            # The pipeline reads the records as strings, and converts the
+            # other columns to the types inferred from the first records. It
+            # writes the errors for each record as it goes, so there are no
+            # records left to validate below.
+            column_types = schema_tools.get_column_types(manifest_file, json_schemas)
+            manifest_file.seek(0)
 
-        # We are not currently allowing multiple types in reference
-        # definitions, so convert Booleans to strings if the key is also
-        # allowed to contain string values.
-        converted_clean_record = schema_tools.convert_from_other(clean_record,
-                                           json_schema,
-                                           schema_tools.convert_bool_to_string)
+            validation_pipeline = pipeline_tools.ValidationPipeline(
+                json_schemas, schema_validators, key_checkers, schema_labels,
+                error_aggregators=error_aggregators if args.aggregate else None,
+                column_types=column_types, workers=args.workers,
+                queue_size=args.queue_size, fail_fast=args.fail_fast)
+            validation_pipeline.run(schema_tools.read_manifest_chunks(manifest_file,
+                                        use_pyarrow=args.pyarrow,
+                                        chunk_size=args.chunk_size),
+                                    first_record, sys.stdout)
+            schema_records = []
+
+            if args.pipeline_stats:
+                print(validation_pipeline.stats_report(), file=sys.stderr)
+
+        else:
+            # Columns read as strings for one schema but not another are read
+            # again, with the types the parser infers, for the other schemas.
+            inferred_df = schema_tools.read_inferred_columns(manifest_file, json_schemas,
+                                                             use_pyarrow=args.pyarrow,
+                                                             string_columns=string_columns)
+            manifest_file.seek(0)
+
+            data_file_df = schema_tools.read_manifest(manifest_file,
+                                                      json_schemas[0],
+                                                      use_pyarrow=args.pyarrow,
+                                                      string_columns=string_columns)
+            manifest_columns = schema_tools.ManifestColumns(data_file_df, json_schemas[0])
+            schema_records = [manifest_columns.for_schema(json_schema, inferred_df)
+                              for json_schema in json_schemas]
+            file_columns = manifest_columns.columns
+
+    # Validate a sample of the records. Unique and foreign keys are only
+    # checked in a full run. The errors are kept, so that a full run does not
+    # validate the sampled records again.
+    sampled_errors = {}
+
+    if args.sample is not None:
+        # A sample read from the file holds only the sampled records, in
+        # order; otherwise the sample is chosen from all of the records.
+        sample_read = manifest_file is not args.validation_obj_file
+        if not sample_read:
+            record_count = len(schema_records[0])
+            edge_positions, stratified_positions = sample_tools.sample_positions(
+                record_count, args.sample, edge_size=args.sample_edges, seed=args.seed)
+
+        stratified_positions = set(stratified_positions)
+        sample_summary = sample_tools.SampleSummary(
+            record_count,
+            column_keys=[(schema_label, column)
+                         for schema_label, json_schema in zip(schema_labels, json_schemas)
+                         for column in json_schema["properties"] if column in file_columns])
+
+        for row_number, position in enumerate(sorted(stratified_positions.union(edge_positions))):
+            record_row = row_number if sample_read else position
+            record_errors = [list(schema_validator.iter_errors(data_records[record_row]))
+                             for schema_validator, data_records
+                             in zip(schema_validators, schema_records)]
+            sampled_errors[position] = record_errors
+            sample_summary.add(record_errors, schema_labels,
+                               position in stratified_positions)
+
+        print(sample_summary.report())
+
+        if not args.upgrade:
+            for key_checker in key_checkers:
+                key_checker.close()
+            return
+
+    for line_number, data_records in enumerate(zip(*schema_records)):
+        record_number = first_record + line_number
+        record_failed = False
+
+        for schema_number, data_record in enumerate(data_records):
+            if line_number in sampled_errors:
+                schema_errors = iter(sampled_errors[line_number][schema_number])
+            else:
+                schema_errors = schema_validators[schema_number].iter_errors(data_record)
+
+            key_checker = key_checkers[schema_number]
+            if key_checker:
+                schema_errors = itertools.chain(schema_errors,
+                                                key_checker.iter_errors(data_record,
+                                                                        record_number))
+
+            if args.fail_fast:
+                schema_errors = list(schema_errors)
+                record_failed = record_failed or bool(schema_errors)
+
+            if args.aggregate:
+                error_aggregators[schema_number].add(schema_errors, record_number)
+                continue
+
+            row_error = schema_tools.validation_errors(schema_errors,
+                                                       line_prepend=f"Record {record_number}: ",
+                                                       schema_prepend=schema_labels[schema_number])
+
+            if row_error:
+                validation_errors += row_error
 
-        schema_errors = schema_validator.iter_errors(converted_clean_record)
+        if record_failed:
+            break
 
-        record_number = "Record " + str(first_record + line_number) + ": "
-        row_error = schema_tools.validation_errors(schema_errors,
-                                                   line_prepend=record_number)
+    for key_checker in key_checkers:
+        key_checker.close()
 
-        if row_error:
-            validation_errors += row_error
+    if args.aggregate:
+        validation_errors = "".join(error_aggregator.summary()
+                                    for error_aggregator in error_aggregators)
 
     print(validation_errors)
 
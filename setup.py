@@ -21,4 +21,7 @@ setup(name="dccjsonvalidation",
           "pandas>=0.20.0",
           "synapseclient>=1.9",
           "jsonschema[format]>=3.0.2"
-      ])
+      ],
+      extras_require={
+          "pyarrow": ["pyarrow>=1.0"]
+      })
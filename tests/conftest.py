@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The programs import each other as top-level modules, e.g. "import
+# schema_tools", so put the package directory on the path.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "dccjsonvalidation"))
@@ -0,0 +1,38 @@
+import key_tools
+
+
+def test_key_value_matches_whole_number_floats():
+    assert key_tools.key_value({"id": 1.0}, ["id"]) == key_tools.key_value({"id": "1"}, ["id"])
+    assert key_tools.key_value({"id": 1.5}, ["id"]) == key_tools.key_value({"id": "1.5"}, ["id"])
+    assert key_tools.key_value({"id": True}, ["id"]) == key_tools.key_value({"id": "true"}, ["id"])
+    assert key_tools.key_value({}, ["id"]) is None
+
+
+def test_key_index_spills_to_disk():
+    key_index = key_tools.KeyIndex(max_keys=2)
+    try:
+        assert key_index.add("a", 2) is None
+        assert key_index.add("b", 3) is None
+        assert key_index.add("c", 4) is None
+        assert key_index.connection is not None
+        assert key_index.add("a", 5) == 2
+        assert key_index.get("c") == 4
+        assert key_index.get("d") is None
+    finally:
+        key_index.close()
+
+
+def test_reference_manifest_problems(tmp_path):
+    reference_file = tmp_path / "individual.csv"
+    reference_file.write_text("individualID,species\n1,human\n")
+    json_schema = {"properties": {},
+                   "foreignKeys": [{"columns": ["individualID"], "manifest": "individual"},
+                                   {"columns": ["specimenID", "assay"],
+                                    "manifest": "individual"},
+                                   {"columns": ["donor"], "manifest": "donor"}]}
+    reference_manifests = {"individual": str(reference_file),
+                           "donor": str(tmp_path / "missing.csv")}
+
+    assert key_tools.reference_manifest_problems(json_schema, reference_manifests) == [
+        f"reference manifest individual ({reference_file}) has no column(s) specimenID, assay",
+        f"reference manifest donor file not found: {tmp_path / 'missing.csv'}"]
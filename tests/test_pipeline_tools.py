@@ -0,0 +1,71 @@
+import io
+import threading
+
+import pytest
+
+import pipeline_tools
+import schema_tools
+
+
+JSON_SCHEMA = {"properties": {"id": {"type": "string"},
+                              "n": {"type": "integer", "maximum": 999}}}
+
+
+def write_manifest(tmp_path, record_count, bad_records=()):
+    manifest_file = tmp_path / "manifest.csv"
+    manifest_file.write_text("id,n\n" + "".join(
+        f"r{number},{number + 1000 if number in bad_records else number}\n"
+        for number in range(record_count)))
+    return manifest_file
+
+
+def run_pipeline(manifest_file, chunk_size=3, manifest_chunks=None, **pipeline_options):
+    output = io.StringIO()
+
+    with open(manifest_file) as manifest_file_handle:
+        column_types = schema_tools.get_column_types(manifest_file_handle, [JSON_SCHEMA])
+        manifest_file_handle.seek(0)
+        validation_pipeline = pipeline_tools.ValidationPipeline(
+            [JSON_SCHEMA], [schema_tools.create_validator(JSON_SCHEMA)], [None], [""],
+            column_types=column_types, **pipeline_options)
+        if manifest_chunks is None:
+            manifest_chunks = schema_tools.read_manifest_chunks(manifest_file_handle,
+                                                                chunk_size=chunk_size)
+        validation_pipeline.run(manifest_chunks, 2, output)
+
+    return output.getvalue().splitlines()
+
+
+def test_pipeline_writes_records_in_file_order(tmp_path):
+    bad_records = set(range(0, 200, 7))
+    manifest_file = write_manifest(tmp_path, 200, bad_records)
+
+    output_lines = run_pipeline(manifest_file, chunk_size=3, workers=4, queue_size=2)
+
+    assert output_lines == [f"Record {number + 2}: n: {number + 1000} is greater than the "
+                            f"maximum of 999" for number in sorted(bad_records)]
+
+
+def test_pipeline_fail_fast_stops_all_stages(tmp_path):
+    manifest_file = write_manifest(tmp_path, 500, bad_records={10, 20, 400})
+    threads_before = threading.active_count()
+
+    output_lines = run_pipeline(manifest_file, chunk_size=2, workers=3, queue_size=2,
+                                fail_fast=True)
+
+    assert output_lines == ["Record 12: n: 1010 is greater than the maximum of 999"]
+    assert threading.active_count() == threads_before
+
+
+def test_pipeline_reraises_stage_error(tmp_path):
+    manifest_file = write_manifest(tmp_path, 10)
+
+    def failing_chunks():
+        with open(manifest_file) as manifest_file_handle:
+            chunk_iterator = schema_tools.read_manifest_chunks(manifest_file_handle,
+                                                               chunk_size=2)
+            yield next(chunk_iterator)
+        raise ValueError("unreadable chunk")
+
+    with pytest.raises(ValueError, match="unreadable chunk"):
+        run_pipeline(manifest_file, manifest_chunks=failing_chunks(), workers=2)
@@ -0,0 +1,51 @@
+import sample_tools
+import schema_tools
+
+
+def test_sample_manifest_file_keeps_sampled_lines(tmp_path):
+    manifest_file = tmp_path / "manifest.csv"
+    manifest_file.write_text("id,n\n" + "".join(f"r{number},{number}\n" for number in range(100))
+                             + "\n")
+
+    with open(manifest_file) as manifest_file_handle:
+        sample_file_handle, record_count, edge_positions, stratified_positions = \
+            sample_tools.sample_manifest_file(manifest_file_handle, 5, edge_size=2, seed=1)
+
+    assert record_count == 100
+    assert (edge_positions, stratified_positions) == \
+        sample_tools.sample_positions(100, 5, edge_size=2, seed=1)
+
+    lines = sample_file_handle.read().splitlines()
+    assert lines[0] == "id,n"
+    assert lines[1:] == [f"r{position},{position}"
+                         for position in sorted(set(edge_positions).union(stratified_positions))]
+
+
+def test_sample_summary_reports_columns_without_failures():
+    validator = schema_tools.create_validator({"properties": {"col": {"enum": ["ok"]},
+                                                              "other": {"type": "string"}}})
+    sample_summary = sample_tools.SampleSummary(1000, column_keys=[("", "col"), ("", "other")])
+    for value in ["ok", "bad", "ok", "ok"]:
+        sample_summary.add([list(validator.iter_errors({"col": value, "other": "x"}))], [""],
+                           True)
+
+    report_lines = sample_summary.report().splitlines()
+    assert "  col: 25.0% (95% CI 4.6%-69.9%)" in report_lines
+    assert "  other: 0.0% (95% CI 0.0%-49.0%)" in report_lines
+
+
+def test_sample_manifest_file_handles_quoted_line_breaks(tmp_path):
+    manifest_file = tmp_path / "manifest.csv"
+    manifest_file.write_text('id,note\n' + "".join(f'r{number},"line one\nline two"\n'
+                                                   for number in range(20)))
+
+    with open(manifest_file) as manifest_file_handle:
+        sample_file_handle, record_count, edge_positions, stratified_positions = \
+            sample_tools.sample_manifest_file(manifest_file_handle, 3, edge_size=2, seed=1)
+
+    manifest_df = schema_tools.read_manifest(sample_file_handle, {"properties": {}})
+    sampled_positions = sorted(set(edge_positions).union(stratified_positions))
+
+    assert record_count == 20
+    assert manifest_df["id"].tolist() == [f"r{position}" for position in sampled_positions]
+    assert manifest_df["note"].tolist() == ["line one\nline two"] * len(sampled_positions)
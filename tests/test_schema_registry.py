@@ -0,0 +1,43 @@
+import json
+import schema_registry
+import schema_tools
+
+
+def write_schema(tmp_path, file_name, property_type):
+    schema_file_name = tmp_path / file_name
+    schema_file_name.write_text(json.dumps({"type": "object",
+                                            "properties": {"col": {"type": property_type}}}))
+    return str(schema_file_name)
+
+
+def test_registry_caches_and_evicts(tmp_path):
+    registry = schema_registry.SchemaRegistry(max_size=1)
+    registry.register("a", write_schema(tmp_path, "a.json", "string"))
+    registry.register("b", write_schema(tmp_path, "b.json", "integer"))
+
+    assert list(registry.validate_records([{"col": "x"}, {"col": 1}], "a")) != []
+    registry.get("a")
+    registry.get("b")
+
+    assert registry.stats() == {"size": 1, "max_size": 1, "hits": 1, "misses": 2,
+                                "evictions": 1}
+
+
+def test_registry_does_not_cache_load_from_before_register(tmp_path, monkeypatch):
+    registry = schema_registry.SchemaRegistry()
+    registry.register("a", write_schema(tmp_path, "old.json", "string"))
+    new_schema_file_name = write_schema(tmp_path, "new.json", "integer")
+
+    # Register the new file while the old one is loading.
+    load_and_deref = schema_tools.load_and_deref
+
+    def register_during_load(schema_file):
+        registry.register("a", new_schema_file_name)
+        return load_and_deref(schema_file)
+
+    monkeypatch.setattr(schema_tools, "load_and_deref", register_during_load)
+    old_schema = registry.get("a")
+    monkeypatch.setattr(schema_tools, "load_and_deref", load_and_deref)
+
+    assert old_schema.json_schema["properties"]["col"]["type"] == "string"
+    assert registry.get("a").json_schema["properties"]["col"]["type"] == "integer"
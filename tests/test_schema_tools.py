@@ -0,0 +1,198 @@
+import pytest
+
+import schema_tools
+
+
+VALUE_SCHEMA = {"type": "object",
+                "properties": {"col": {"enum": ["ok"]}}}
+
+
+CONST_SCHEMA = {"type": "object",
+                "properties": {
+                    "any_of": {"anyOf": [{"const": "a", "description": "A"}, {"const": 1},
+                                         {"const": 2.5}, {"const": True}, {"const": None}]},
+                    "enum": {"enum": ["a", 1, 2.5, False, None]},
+                    "mixed": {"anyOf": [{"const": "a"}, {"type": "integer", "minimum": 5}]}}}
+
+
+def error_details(validator, instance):
+    return [(error.message, error.validator, list(error.relative_schema_path), list(error.path))
+            for error in validator.iter_errors(instance)]
+
+
+@pytest.mark.parametrize("column", ["any_of", "enum", "mixed"])
+@pytest.mark.parametrize("value", ["a", "b", 1, 1.0, 0, 7, 2.5, True, False, None,
+                                   [1], {"a": 1}])
+def test_create_validator_matches_draft7(column, value):
+    import jsonschema
+
+    assert error_details(schema_tools.create_validator(CONST_SCHEMA), {column: value}) == \
+        error_details(jsonschema.Draft7Validator(CONST_SCHEMA), {column: value})
+
+
+def test_get_const_sets_leaves_mixed_any_of_to_jsonschema():
+    schema_properties = CONST_SCHEMA["properties"]
+    const_sets = schema_tools.get_const_sets(CONST_SCHEMA)
+
+    assert sorted(const_sets) == sorted([id(schema_properties["any_of"]["anyOf"]),
+                                         id(schema_properties["enum"]["enum"])])
+
+
+def aggregate(values, max_values):
+    validator = schema_tools.create_validator(VALUE_SCHEMA)
+    error_aggregator = schema_tools.ErrorAggregator(max_values=max_values)
+    for record_number, value in enumerate(values, 2):
+        error_aggregator.add(validator.iter_errors({"col": value}), record_number)
+    return error_aggregator.summary().splitlines()
+
+
+def test_error_aggregator_groups_values():
+    summary = aggregate(["a", "a", "ok", "a", "b"], max_values=10)
+
+    assert summary == ["Records 2–3, 5: col: 'a' is not one of ['ok'] (3 errors)",
+                       "Record 6: col: 'b' is not one of ['ok'] (1 error)"]
+
+
+def test_error_aggregator_keeps_new_value_when_full():
+    summary = aggregate(["v1", "v2", "v3", "v4"] + ["late"] * 50, max_values=4)
+
+    assert summary[0] == ("Records 6–55: col: 'late' is not one of ['ok'] "
+                          "(50 to 51 errors, earlier records not listed)")
+    assert len(summary) == 4
+
+
+def test_manifest_row_contains_does_not_convert():
+    import pandas as pd
+
+    json_schema = {"properties": {"flag": {"anyOf": [{"const": "true"}, {"const": 1}]}}}
+    manifest_df = pd.DataFrame({"flag": [True, None], "other": [None, "x"]})
+    manifest_columns = schema_tools.ManifestColumns(manifest_df, json_schema)
+
+    converted_values = []
+    manifest_columns.column_converters[0] = lambda value: converted_values.append(value) or value
+
+    first_row, second_row = manifest_columns.rows()
+    assert "flag" in first_row
+    assert "other" not in first_row
+    assert "missing" not in first_row
+    assert "flag" not in second_row
+    assert converted_values == []
+    assert dict(second_row) == {"other": "x"}
+
+
+@pytest.mark.parametrize("integer_first", [False, True])
+def test_shared_string_columns_match_single_schema_read(tmp_path, integer_first):
+    manifest_file = tmp_path / "manifest.csv"
+    manifest_file.write_text("id,n\nx,1_000\ny,3\nz, 7 \nw,1\n")
+    string_schema = {"properties": {"id": {"type": "string"}, "n": {"type": "string"}}}
+    integer_schema = {"properties": {"id": {"type": "string"}, "n": {"type": "integer"}}}
+    json_schemas = [string_schema, integer_schema]
+    if integer_first:
+        json_schemas.reverse()
+    string_columns = schema_tools.get_shared_string_columns(json_schemas)
+
+    with open(manifest_file) as manifest_file_handle:
+        single_df = schema_tools.read_manifest(manifest_file_handle, integer_schema)
+        manifest_file_handle.seek(0)
+        manifest_df = schema_tools.read_manifest(manifest_file_handle, json_schemas[0],
+                                                 string_columns=string_columns)
+        inferred_df = schema_tools.read_inferred_columns(manifest_file_handle, json_schemas,
+                                                         string_columns=string_columns)
+
+    manifest_columns = schema_tools.ManifestColumns(manifest_df, json_schemas[0])
+    schema_records = [manifest_columns.for_schema(json_schema, inferred_df)
+                      for json_schema in json_schemas]
+    if integer_first:
+        schema_records.reverse()
+    string_records, integer_records = schema_records
+    single_records = schema_tools.ManifestColumns(single_df, integer_schema)
+
+    assert [dict(record) for record in integer_records] == \
+        [dict(record) for record in single_records]
+    assert [record["n"] for record in string_records] == ["1_000", "3", " 7 ", "1"]
+
+
+@pytest.mark.parametrize("use_pyarrow", [False, True])
+def test_manifest_chunk_types_do_not_depend_on_chunk_size(tmp_path, use_pyarrow):
+    if use_pyarrow:
+        pytest.importorskip("pyarrow")
+
+    manifest_file = tmp_path / "manifest.csv"
+    manifest_file.write_text("id,n,flag\nx,1,true\ny,2,\nz,abc,FALSE\nw,4,true\n")
+    json_schema = {"properties": {"id": {"type": "string"}}}
+
+    def chunk_records(chunk_size):
+        with open(manifest_file) as manifest_file_handle:
+            column_types = schema_tools.get_column_types(manifest_file_handle, [json_schema],
+                                                         type_records=2)
+            manifest_file_handle.seek(0)
+            chunk_records = []
+            for manifest_df in schema_tools.read_manifest_chunks(manifest_file_handle,
+                                                                 use_pyarrow=use_pyarrow,
+                                                                 chunk_size=chunk_size):
+                converted_df = schema_tools.convert_column_types(manifest_df, column_types)
+                manifest_columns = schema_tools.ManifestColumns(manifest_df, json_schema)
+                chunk_records.extend(dict(record) for record
+                                     in manifest_columns.for_schema(json_schema, converted_df))
+        return chunk_records
+
+    assert chunk_records(1) == chunk_records(3) == chunk_records(100) == \
+        [{"id": "x", "n": 1, "flag": True}, {"id": "y", "n": 2},
+         {"id": "z", "n": "abc", "flag": False}, {"id": "w", "n": 4, "flag": True}]
+
+
+def test_get_definitions_values():
+    json_schema = {"properties": {"id": {"type": "string", "description": "Identifier",
+                                         "pattern": "^ID"},
+                                  "sex": {"anyOf": [{"const": "male", "description": "m"},
+                                                    {"const": "female"}]}},
+                   "required": ["id"]}
+
+    definitions_df, values_df = schema_tools.get_definitions_values(json_schema)
+
+    assert definitions_df["key"].tolist() == ["id", "sex"]
+    assert definitions_df["required"].tolist() == [True, False]
+    assert values_df.columns.tolist() == ["key", "value", "valueDescription", "source"]
+    assert values_df["value"].tolist() == ["^ID", "male", "female"]
+    assert values_df["valueDescription"].fillna("").tolist() == ["", "m", ""]
+
+
+def test_get_string_columns_allows_nulls():
+    json_schema = {"properties": {"id": {"type": ["string", "null"]},
+                                  "code": {"anyOf": [{"const": "a"}, {"type": "null"}]},
+                                  "grade": {"enum": ["low", "high", None]},
+                                  "count": {"type": ["integer", "null"]},
+                                  "either": {"type": ["string", "integer"]}}}
+
+    assert schema_tools.get_string_columns(json_schema) == (["id", "code", "grade"], [])
+
+
+def test_get_string_columns_mixed_only_without_booleans():
+    json_schema = {"properties": {"sex": {"anyOf": [{"const": "male"}, {"const": "female"}]},
+                                  "flag": {"anyOf": [{"const": "true"}, {"const": 1}]},
+                                  "partial": {"anyOf": [{"const": "true"}, {"const": False}]},
+                                  "answer": {"enum": [True, False, "Unknown"]},
+                                  "status": {"anyOf": [{"const": "Unknown"},
+                                                       {"type": "boolean"}]},
+                                  "count": {"enum": [1, 2]},
+                                  "age": {"type": "integer"}}}
+
+    assert schema_tools.get_string_columns(json_schema) == (["sex"], ["flag", "partial"])
+
+    flag_converter, partial_converter = schema_tools.get_column_converters(
+        json_schema, ["flag", "partial"])
+    assert [flag_converter(value) for value in [True, False, 1]] == ["true", "false", 1]
+    assert [partial_converter(value) for value in [True, False]] == ["true", False]
+
+
+def test_boolean_enum_values_are_not_converted(tmp_path):
+    manifest_file = tmp_path / "manifest.csv"
+    manifest_file.write_text("answer\ntrue\nfalse\n")
+    json_schema = {"properties": {"answer": {"enum": [True, False, "Unknown"]}}}
+
+    with open(manifest_file) as manifest_file_handle:
+        manifest_df = schema_tools.read_manifest(manifest_file_handle, json_schema)
+
+    validator = schema_tools.create_validator(json_schema)
+    assert [list(validator.iter_errors(record))
+            for record in schema_tools.ManifestColumns(manifest_df, json_schema)] == [[], []]
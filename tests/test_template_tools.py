@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+import template_tools
+
+
+def test_dictionary_arrow_writes_list_values_as_json(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    dictionary_df = pd.DataFrame([{"key": "age", "type": ["integer", "null"],
+                                   "description": None, "required": True,
+                                   "maximumSize": None}])
+    values_df = pd.DataFrame([{"key": "age", "value": [1, 2], "valueDescription": None,
+                               "source": None},
+                              {"key": "age", "value": True, "valueDescription": None,
+                               "source": None}])
+
+    template_tools.dictionary_arrow(str(tmp_path / "template.parquet"), dictionary_df,
+                                    values_df, {"age": "clinical"})
+
+    dictionary_table = template_tools.load_dictionary_arrow(
+        str(tmp_path / "template_dictionary.parquet"))
+    values_table = template_tools.load_dictionary_arrow(str(tmp_path / "template_values.parquet"))
+    assert dictionary_table.column("type").to_pylist() == ['["integer", "null"]']
+    assert values_table.column("value").to_pylist() == ["[1, 2]", "true"]
+
+
+def test_dictionary_arrow_extension_matches_format(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    dictionary_df = pd.DataFrame([{"key": "age", "type": "integer", "description": None,
+                                   "required": False, "maximumSize": 3}])
+    values_df = pd.DataFrame(columns=["key", "value", "valueDescription", "source"])
+
+    template_tools.dictionary_arrow(str(tmp_path / "template.parquet"), dictionary_df,
+                                    values_df, {}, file_format="arrow")
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+        ["template_dictionary.arrow", "template_values.arrow"]
+    dictionary_table = template_tools.load_dictionary_arrow(
+        str(tmp_path / "template_dictionary.arrow"))
+    assert dictionary_table.column("maximumSize").to_pylist() == [3]